@@ -0,0 +1,192 @@
+"""
+CART建树过程的跟踪器
+CART(tracer=BuildTracer())时，被@traced装饰的方法在调用前后通知跟踪器：
+每个节点记录深度、样本数、扫描的特征数，以及各阶段（划分查找、原地划分、isSame、预剪枝的不纯度计算等）的耗时和分配的内存；
+结果可导出为JSON或Chrome trace（chrome://tracing、Perfetto可直接打开），也可按深度汇总
+"""
+import json
+import time
+import tracemalloc
+import pandas as pd
+
+
+class BuildTracer:
+    def __init__(self, memory=False):
+        """
+        :param memory: 是否用tracemalloc统计每个阶段分配的内存（峰值增量），开启后建树会明显变慢
+        """
+        self.memory = memory
+        self.nodes = []
+        self.phases = []
+        self._node_stack = []
+        self._phase_stack = []
+        self._origin = None
+        self._started_tracemalloc = False
+
+    def _now(self)-> float:
+        if self._origin is None:
+            self._origin = time.perf_counter()
+            if self.memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+        return time.perf_counter() - self._origin
+
+    def stop(self):
+        """
+        停止由跟踪器开启的tracemalloc
+        """
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def enterNode(self, depth: int, rows: int):
+        """
+        开始构建一个节点（逐层构建时为一层）
+        param:
+            depth: 深度
+            rows: 样本数
+        """
+        start = self._now()
+        record = {'id': len(self.nodes), 'parent': self._node_stack[-1]['id'] if self._node_stack else None,
+                  'depth': depth, 'rows': int(rows), 'features': 0, 'start': start, 'end': None,
+                  'time': {}, 'bytes': {}, 'children_time': 0.0}
+        self.nodes.append(record)
+        self._node_stack.append(record)
+
+    def exitNode(self):
+        """
+        节点构建完成（包括其子树）
+        """
+        record = self._node_stack.pop()
+        record['end'] = self._now()
+        if self._node_stack:
+            self._node_stack[-1]['children_time'] += record['end'] - record['start']
+
+    def enterPhase(self, name: str):
+        """
+        开始一个阶段，阶段的耗时和内存记在当前节点上
+        param:
+            name: 阶段名
+        """
+        frame = {'name': name, 'start': self._now(), 'base': 0, 'peak': 0}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # 嵌套阶段会重置峰值，先把外层阶段到目前为止的峰值保存下来
+            if self._phase_stack:
+                self._phase_stack[-1]['peak'] = max(self._phase_stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['base'] = current
+        self._phase_stack.append(frame)
+
+    def exitPhase(self, name: str, features=None):
+        """
+        阶段结束
+        param:
+            name: 阶段名
+            features: 该阶段扫描的特征数，计入当前节点
+        """
+        frame = self._phase_stack.pop()
+        end = self._now()
+        allocated = 0
+        if self.memory:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            allocated = max(peak - frame['base'], 0)
+            if self._phase_stack:
+                self._phase_stack[-1]['peak'] = max(self._phase_stack[-1]['peak'], peak)
+        node = self._node_stack[-1] if self._node_stack else None
+        if node is not None:
+            node['time'][name] = node['time'].get(name, 0.0) + end - frame['start']
+            node['bytes'][name] = node['bytes'].get(name, 0) + allocated
+            if features is not None:
+                node['features'] += features
+        self.phases.append({'name': name, 'node': None if node is None else node['id'], 'start': frame['start'],
+                            'end': end, 'bytes': allocated})
+
+    def toJSON(self, path=None)-> dict:
+        """
+        导出为JSON：节点列表（含各阶段耗时、内存）和阶段事件列表
+        param:
+            path: 文件路径，为None时只返回字典
+        return:
+            trace: 跟踪结果
+        """
+        nodes = []
+        for record in self.nodes:
+            record = dict(record)
+            end = record['end'] if record['end'] is not None else record['start']
+            record['self_time'] = end - record['start'] - record.pop('children_time')
+            nodes.append(record)
+        trace = {'nodes': nodes, 'phases': self.phases}
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(trace, f, ensure_ascii=False)
+        return trace
+
+    def toChromeTrace(self, path=None)-> dict:
+        """
+        导出为Chrome trace事件格式，节点和阶段都是完整事件(ph='X')，按时间嵌套显示
+        param:
+            path: 文件路径，为None时只返回字典
+        return:
+            trace: {'traceEvents': [...]}
+        """
+        events = []
+        for record in self.nodes:
+            end = record['end'] if record['end'] is not None else record['start']
+            events.append({'name': f"node depth={record['depth']}", 'cat': 'node', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': record['start'] * 1e6, 'dur': (end - record['start']) * 1e6,
+                           'args': {'id': record['id'], 'depth': record['depth'], 'rows': record['rows'],
+                                    'features': record['features']}})
+        for phase in self.phases:
+            events.append({'name': phase['name'], 'cat': 'phase', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': phase['start'] * 1e6, 'dur': (phase['end'] - phase['start']) * 1e6,
+                           'args': {'node': phase['node'], 'bytes': phase['bytes']}})
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(trace, f)
+        return trace
+
+    def summary(self)-> pd.DataFrame:
+        """
+        按深度汇总：节点数、样本数、扫描的特征数、各阶段耗时（秒）、节点自身耗时和分配的内存
+        return:
+            table: 每个深度一行
+        """
+        rows = []
+        for record in self.toJSON()['nodes']:
+            row = {'depth': record['depth'], 'nodes': 1, 'rows': record['rows'], 'features': record['features'],
+                   'self_time': record['self_time'], 'bytes': sum(record['bytes'].values())}
+            row.update({f"time_{name}": value for name, value in record['time'].items()})
+            rows.append(row)
+        if not rows:
+            return pd.DataFrame()
+        return pd.DataFrame(rows).groupby('depth').sum().fillna(0.0)
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import numpy as np
+    try:
+        from .CART import CART
+    except ImportError:
+        from CART import CART
+    # 同一份回归数据：不跟踪、只计时、同时统计内存三种情况下的训练耗时，以及按深度汇总的各阶段耗时
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(50000, 8))
+    y = 2*X[:, 0] + np.sin(3*X[:, 1]) + X[:, 2]*X[:, 3] + 0.1*rng.normal(size=len(X))
+    attributes = [f"x{i}" for i in range(X.shape[1])]
+    data = np.column_stack((X, y)).astype(object)
+    for tracer in [None, BuildTracer(), BuildTracer(memory=True)]:
+        cart = CART(min_samples_split=50, max_depth=8, min_impurity_decrease=1e-3, criterion='weighted', tracer=tracer)
+        start_time = time.time()
+        cart.fit('regression', data, attributes, [1]*len(attributes))
+        print(f"tracer={'off' if tracer is None else 'memory' if tracer.memory else 'time'}: fit {time.time() - start_time:.2f}s")
+        if tracer is not None:
+            tracer.stop()
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(tracer.summary())
+    path = os.path.join(tempfile.gettempdir(), 'cart_trace.json')
+    tracer.toChromeTrace(path)
+    print(f"chrome trace written to {path}")
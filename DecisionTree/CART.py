@@ -7,7 +7,16 @@ from math import inf
 from collections import defaultdict
 import os
 import copy
+import functools
+import multiprocessing
+from multiprocessing import shared_memory
 from ucimlrepo import fetch_ucirepo 
+try:
+    from .ModelIO import register_model, save_model
+    from .TreeLayout import iter_dot, render_tree, write_dot
+except ImportError:
+    from ModelIO import register_model, save_model
+    from TreeLayout import iter_dot, render_tree, write_dot
   
 
 
@@ -27,6 +36,63 @@ def type_check(func):
         return func(*args, **kwargs)
     return wrapper
 
+def traced(phase: str, node=False, count=None):
+    """
+    建树过程的跟踪钩子：self.tracer为None时直接调用原函数，只多一次属性判断；
+    否则在调用前后通知跟踪器（见BuildTracer）
+    :param phase: 阶段名
+    :param node: 为True时被装饰的函数构建一个节点（参数中的start、end、depth给出样本数和深度）
+    :param count: 计入节点扫描特征数的参数名，参数为列表时计其长度，否则计1
+    """
+    def decorator(func):
+        names = func.__code__.co_varnames[1:func.__code__.co_argcount]
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            tracer = self.tracer
+            if tracer is None:
+                return func(self, *args, **kwargs)
+            bound = dict(zip(names, args), **kwargs)
+            if node:
+                tracer.enterNode(bound.get('depth', 1), bound['end'] - bound['start'])
+            else:
+                tracer.enterPhase(phase)
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                if node:
+                    tracer.exitNode()
+                else:
+                    if count is None:
+                        tracer.exitPhase(phase)
+                    else:
+                        tracer.exitPhase(phase, len(bound[count]) if isinstance(bound[count], (list, np.ndarray)) else 1)
+        return wrapper
+    return decorator
+
+def create_shared_array(shape: tuple, dtype, order='C'):
+    """
+    在共享内存上创建numpy数组
+    :param shape: 数组形状
+    :param dtype: 数据类型
+    :param order: 存储顺序
+    :return: 共享内存句柄，数组，子进程attach使用的描述
+    """
+    dtype = np.dtype(dtype)
+    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, order=order)
+    return shm, array, (shm.name, tuple(shape), dtype.str, order)
+
+def attach_shared_array(desc: tuple):
+    """
+    在子进程中按描述attach共享内存上的数组
+    :param desc: create_shared_array返回的描述
+    :return: 共享内存句柄，数组
+    """
+    name, shape, dtype, order = desc
+    # 共享内存由创建它的进程负责unlink，子进程只close
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf, order=order)
+
 class Node:
     def __init__(self):
         self.feature = None # 特征
@@ -36,29 +102,59 @@ class Node:
         self.left = None # 左子树
         self.label = None # 叶节点label
         self.isleaf = False  # 是否为叶节点
+        self.weight = None # 训练样本的权重和（TreeSHAP的cover）
     
-    def to_dot(self, dot_lines, node_id=0):
+    def _layoutChildren(self)-> list:
+        """
+        布局用的子节点及边标签，左子树为满足划分条件的一侧
+        :return: [(边标签, 子节点)]
+        """
+        return [(edge, child) for edge, child in (("True", self.left), ("False", self.right)) if child is not None]
+
+    def _layoutText(self)-> str:
+        """
+        节点上显示的文本
+        :return: 叶节点为类别（回归值），内部节点为特征和划分条件
+        """
+        if self.isleaf:
+            return f"类别: {self.label}"
+        if self.classlabel == 'num':
+            return f"{self.feature}\n阈值: {self.threshold:.2f}"
+        return f"{self.feature}\n{self.threshold_text()}"
+
+    def to_dot(self, dot_lines, node_id=0, max_depth=None, top_n=None):
         """
-        递归生成 graphviz dot 格式内容
+        生成 graphviz dot 格式内容（先序编号，非递归）
         :param dot_lines: 存储 dot 语句的列表
         :param node_id: 当前节点的唯一编号
+        :param max_depth: 截断深度，更深的子树折叠为一个节点
+        :param top_n: 最多输出的节点数，优先展开样本权重大的节点
         :return: 当前节点编号，下一可用编号
         """
-        this_id = node_id
-        if self.isleaf:
-            dot_lines.append(f'    node{this_id} [label="Leaf\\nlabel={self.label}", shape=box, style=filled, color=lightgrey];')
-        else:
-            dot_lines.append(f'    node{this_id} [label="{self.feature}\\n{self.classlabel}\\n<= {self.threshold}"];')
-        next_id = this_id + 1
-        # 递归左子树
-        if self.left:
-            left_id, next_id = self.left.to_dot(dot_lines, next_id)
-            dot_lines.append(f'    node{this_id} -> node{left_id} [label="True"];')
-        # 递归右子树
-        if self.right:
-            right_id, next_id = self.right.to_dot(dot_lines, next_id)
-            dot_lines.append(f'    node{this_id} -> node{right_id} [label="False"];')
-        return this_id, next_id
+        next_id = node_id
+        for line in iter_dot(self, max_depth, top_n, node_id):
+            if '->' not in line:
+                next_id += 1
+            dot_lines.append(line)
+        return node_id, next_id
+
+    def write_dot(self, path, max_depth=None, top_n=None):
+        """
+        把树逐行写成 graphviz dot 文件
+        :param path: 文件路径或可写的文本文件对象
+        :param max_depth: 截断深度
+        :param top_n: 最多输出的节点数
+        """
+        write_dot(self, path, max_depth, top_n, name='CART')
+
+    def threshold_text(self):
+        """
+        划分条件的文本，连续特征为“<= 阈值”，离散特征为左子树的取值集合
+        :return: 划分条件
+        """
+        if self.classlabel == 'cat':
+            return "in {" + ", ".join(sorted(str(v) for v in self.threshold)) + "}"
+        return f"<= {self.threshold}"
 
     def get_depth(self):
         """
@@ -82,427 +178,1437 @@ class Node:
         right_width = self.right.get_width() if self.right else 0
         return left_width + right_width
 
-    def _draw_node(self, ax, x, y, node_width, node_height, level_height, total_width):
+    def visualize(self, figsize=None, title="CART决策树可视化", path=None, max_depth=None, top_n=None):
         """
-        递归绘制节点及其子节点
-        :param ax: matplotlib轴对象
-        :param x: 节点中心x坐标
-        :param y: 节点中心y坐标
-        :param node_width: 节点宽度
-        :param node_height: 节点高度
-        :param level_height: 层级高度
-        :param total_width: 总宽度
-        :return: 叶子节点位置列表
+        可视化CART决策树，布局一次后序遍历完成
+        :param figsize: 图形大小，默认按叶节点数和深度确定
+        :param title: 图形标题
+        :param path: 输出文件（.svg/.png等），指定时不经过pyplot直接写文件，适合无显示器的服务器；为None时弹出窗口
+        :param max_depth: 截断深度，更深的子树折叠为一个节点
+        :param top_n: 最多画出的节点数，优先展开样本权重大的节点
         """
-        import matplotlib.patches as patches
-        # 绘制当前节点
-        if self.isleaf:
-            # 叶子节点用圆角矩形表示
-            rect = patches.FancyBboxPatch(
-                (x - node_width/2, y - node_height/2),
-                node_width, node_height,
-                boxstyle=patches.BoxStyle("Round", pad=0.2),
-                facecolor='lightgreen', edgecolor='black', alpha=0.7
-            )
-            ax.add_patch(rect)
-            ax.text(x, y, f"类别: {self.label}", ha='center', va='center', fontsize=10)
-            return [(x, y)]
+        render_tree(self, path, max_depth, top_n, figsize, title)
+
+class ColumnData:
+    def __init__(self, attrs, attrs_type, columns, categories, labels, weights, classes=None):
+        """
+        CART训练使用的列式数据集
+        连续特征存为float64列，缺失值为np.nan；离散特征存为int32编码列，缺失值为-1；
+        标签和样本权重分别存为连续数组
+        :param attrs: 特征列表
+        :param attrs_type: 特征类型，1为连续特征，0为离散特征
+        :param columns: 每个特征对应的一列
+        :param categories: 离散特征的编码表（编码 -> 原始取值），连续特征为None
+        :param labels: 标签，分类任务为类别编码，回归任务为float64
+        :param weights: 样本权重
+        :param classes: 分类任务的类别表（编码 -> 原始类别）
+        """
+        self.attrs = list(attrs)
+        self.attrs_type = list(attrs_type)
+        self.columns = columns
+        self.categories = categories
+        self.labels = labels
+        self.weights = weights
+        self.classes = classes
+
+    @staticmethod
+    def missingMask(col: np.ndarray)-> np.ndarray:
+        """
+        找出原始数据列中的缺失值（NAN字符串、None或nan）
+        param:
+            col: 原始数据列
+        return:
+            mask: 缺失值掩码
+        """
+        if col.dtype.kind in 'fiub':
+            return np.isnan(col.astype(np.float64))
+        return pd.isna(col) | (col == NAN)
+
+    @classmethod
+    def fromArray(cls, task: str, data: np.ndarray, attrs: list, attrs_type: list, weights=None):
+        """
+        由原始的object数组（最后一列为标签）构建列式数据集
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            data: 原始训练数据
+            attrs: 特征列表
+            attrs_type: 特征类型
+            weights: 样本权重，默认为1
+        return:
+            dataset: 列式数据集
+        """
+        n = len(data)
+        num_index = [j for j in range(len(attrs_type)) if attrs_type[j] == 1]
+        cat_index = [j for j in range(len(attrs_type)) if attrs_type[j] == 0]
+        # 同类型的列放在一个按列存储的矩阵中，每一列都是连续内存
+        num = np.empty((n, len(num_index)), dtype=np.float64, order='F')
+        cat = np.empty((n, len(cat_index)), dtype=np.int32, order='F')
+        columns = [None] * len(attrs_type)
+        categories = [None] * len(attrs_type)
+        for k, j in enumerate(num_index):
+            missing = cls.missingMask(data[:, j])
+            num[:, k] = np.where(missing, np.nan, data[:, j]).astype(np.float64)
+            columns[j] = num[:, k]
+        for k, j in enumerate(cat_index):
+            missing = cls.missingMask(data[:, j])
+            codes, uniques = pd.factorize(np.where(missing, None, data[:, j]))
+            cat[:, k] = codes
+            columns[j] = cat[:, k]
+            categories[j] = np.asarray(uniques, dtype=object)
+        if task == 'classification':
+            labels, classes = pd.factorize(data[:, -1])
+            labels = labels.astype(np.int64)
+            classes = np.asarray(classes, dtype=object)
+        elif task == 'regression':
+            labels = data[:, -1].astype(np.float64)
+            classes = None
         else:
-            # 非叶子节点用矩形表示
-            rect = patches.Rectangle(
-                (x - node_width/2, y - node_height/2),
-                node_width, node_height,
-                facecolor='lightblue', edgecolor='black', alpha=0.7
-            )
-            ax.add_patch(rect)
-            # 节点文本
-            if self.classlabel == 'num':
-                node_text = f"{self.feature}\n阈值: {self.threshold:.2f}"
+            raise ValueError("task must be 'classification' or 'regression'")
+        weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+        return cls(attrs, attrs_type, columns, categories, labels, weights, classes)
+
+    def isMissing(self, index: int, values: np.ndarray)-> np.ndarray:
+        """
+        判断某个特征列的取值是否缺失
+        param:
+            index: 特征索引
+            values: 该特征列（或其子集）的取值
+        return:
+            mask: 缺失值掩码
+        """
+        if self.attrs_type[index] == 1:
+            return np.isnan(values)
+        return values < 0
+
+    def encode(self, data=None)-> np.ndarray:
+        """
+        按本数据集的编码生成float64矩阵，作为FlatTree.apply的输入（树需用本数据集的编码表编译，见FlatTree.fromNode）
+        连续特征的缺失值为nan，离散特征为取值编码，缺失或未见过的取值为-1
+        param:
+            data: 原始数据，列顺序与attrs一致；为None时直接由数据集自身的列生成，不再解析原始数据
+        return:
+            X: 编码后的矩阵
+        """
+        if data is None:
+            return np.column_stack(self.columns).astype(np.float64)
+        X = np.empty((len(data), len(self.attrs)))
+        for j in range(len(self.attrs)):
+            if self.attrs_type[j] == 0:
+                X[:, j] = pd.Index(self.categories[j]).get_indexer(data[:, j])
+            elif data.dtype.kind == 'f':
+                X[:, j] = data[:, j]
             else:
-                node_text = f"{self.feature}\n= {self.threshold}"
-            ax.text(x, y, node_text, ha='center', va='center', fontsize=10)
-
-            # 计算子节点位置
-            child_count = sum([self.left is not None, self.right is not None])
-            if child_count == 0:
-                return [(x, y)]
-            child_total_width = 0
-            if self.left:
-                child_total_width += self.left.get_width()
-            if self.right:
-                child_total_width += self.right.get_width()
-            leaf_positions = []
-            child_x_offset = x - (total_width / 2)
-            # 左子树
-            if self.left:
-                left_width = total_width * (self.left.get_width() / child_total_width)
-                left_x = child_x_offset + (left_width / 2)
-                left_y = y - level_height
-                ax.plot([x, left_x], [y - node_height/2, left_y + node_height/2], 'k-')
-                ax.text((x + left_x) / 2, (y - node_height/2 + left_y + node_height/2) / 2, 
-                        "True", ha='center', va='center', fontsize=8, bbox=dict(facecolor='white', alpha=0.7, edgecolor='none'))
-                leaf_positions.extend(self.left._draw_node(ax, left_x, left_y, node_width, node_height, level_height, left_width))
-                child_x_offset += left_width
-            # 右子树
-            if self.right:
-                right_width = total_width * (self.right.get_width() / child_total_width)
-                right_x = child_x_offset + (right_width / 2)
-                right_y = y - level_height
-                ax.plot([x, right_x], [y - node_height/2, right_y + node_height/2], 'k-')
-                ax.text((x + right_x) / 2, (y - node_height/2 + right_y + node_height/2) / 2, 
-                        "False", ha='center', va='center', fontsize=8, bbox=dict(facecolor='white', alpha=0.7, edgecolor='none'))
-                leaf_positions.extend(self.right._draw_node(ax, right_x, right_y, node_width, node_height, level_height, right_width))
-            return leaf_positions
-
-    def visualize(self, figsize=(12, 8), title="CART决策树可视化"):
-        """
-        可视化CART决策树
-        :param figsize: 图形大小
-        :param title: 图形标题
+                missing = self.missingMask(data[:, j])
+                X[:, j] = np.where(missing, np.nan, data[:, j]).astype(np.float64)
+        return X
+
+    def buildBins(self, max_bins=255):
+        """
+        直方图模式的分箱：每个特征只分箱一次，编码为uint8/uint16
+        连续特征按分位数分箱，取值个数不超过max_bins时每个取值单独一箱（与精确划分等价）；
+        离散特征直接以取值编码为箱；缺失值单独放在最后一个箱(n_bins[j])
+        param:
+            max_bins: 连续特征的最大分箱数
+        """
+        self.bins = [None] * len(self.columns)
+        self.bin_upper = [None] * len(self.columns)
+        self.n_bins = [0] * len(self.columns)
+        for j, col in enumerate(self.columns):
+            missing = self.isMissing(j, col)
+            if self.attrs_type[j] == 1:
+                present = col[~missing]
+                uniqueVals = np.unique(present)
+                if len(uniqueVals) <= max_bins:
+                    edges = (uniqueVals[:-1] + uniqueVals[1:]) / 2
+                else:
+                    edges = np.unique(np.quantile(present, np.linspace(0, 1, max_bins + 1)[1:-1]))
+                # x <= edges[b] 落入第b箱，最后一箱的上界为最大值
+                codes = np.searchsorted(edges, np.where(missing, 0.0, col), side='left')
+                self.bin_upper[j] = np.append(edges, uniqueVals[-1] if len(uniqueVals) > 0 else inf)
+                self.n_bins[j] = len(edges) + 1
+            else:
+                codes = col
+                self.n_bins[j] = len(self.categories[j])
+            codes = np.where(missing, self.n_bins[j], codes)
+            self.bins[j] = codes.astype(np.uint8 if self.n_bins[j] < 256 else np.uint16 if self.n_bins[j] < 65536 else np.uint32)
+
+    def share(self)-> dict:
+        """
+        把特征列、标签和权重移入共享内存，之后父进程和子进程读的是同一份数据
+        return:
+            meta: 子进程调用attach所需的描述（只包含共享内存名和编码表，不包含数据本身）
+        """
+        self._shm = []
+        arrays = {}
+        for kind, attr_type, dtype in (('num', 1, np.float64), ('cat', 0, np.int32)):
+            index = [j for j in range(len(self.attrs_type)) if self.attrs_type[j] == attr_type]
+            shm, block, arrays[kind] = create_shared_array((len(self.labels), len(index)), dtype, 'F')
+            for k, j in enumerate(index):
+                block[:, k] = self.columns[j]
+                self.columns[j] = block[:, k]
+            self._shm.append(shm)
+        for name in ('labels', 'weights'):
+            shm, array, arrays[name] = create_shared_array(getattr(self, name).shape, getattr(self, name).dtype)
+            array[...] = getattr(self, name)
+            setattr(self, name, array)
+            self._shm.append(shm)
+        return {'arrays': arrays, 'attrs': self.attrs, 'attrs_type': self.attrs_type,
+                'categories': self.categories, 'classes': self.classes}
+
+    @classmethod
+    def attach(cls, meta: dict):
+        """
+        在子进程中由share返回的描述重建数据集，数组直接映射共享内存，不发生复制
+        param:
+            meta: share返回的描述
+        return:
+            dataset: 列式数据集
+        """
+        shms = {}
+        arrays = {}
+        for name, desc in meta['arrays'].items():
+            shms[name], arrays[name] = attach_shared_array(desc)
+        attrs_type = meta['attrs_type']
+        columns = [None] * len(attrs_type)
+        for kind, attr_type in (('num', 1), ('cat', 0)):
+            index = [j for j in range(len(attrs_type)) if attrs_type[j] == attr_type]
+            for k, j in enumerate(index):
+                columns[j] = arrays[kind][:, k]
+        dataset = cls(meta['attrs'], attrs_type, columns, meta['categories'], arrays['labels'], arrays['weights'], meta['classes'])
+        dataset._shm = list(shms.values())
+        return dataset
+
+    def unshare(self):
         """
-        import matplotlib.pyplot as plt
-        import matplotlib
-        matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'SimSun', 'Arial Unicode MS']
-        matplotlib.rcParams['axes.unicode_minus'] = False
-        fig, ax = plt.subplots(figsize=figsize)
-        depth = self.get_depth()
-        width = self.get_width()
-        node_width = 1.5
-        node_height = 0.8
-        level_height = 2.0
-        total_width = max(width * 2, 10)
-        total_height = depth * level_height
-        ax.set_xlim(-total_width/2, total_width/2)
-        ax.set_ylim(-total_height, 1)
-        self._draw_node(ax, 0, 0, node_width, node_height, level_height, total_width)
-        ax.set_title(title)
-        ax.axis('off')
-        plt.tight_layout()
-        plt.show()
+        把数据从共享内存复制回普通内存并释放共享内存
+        """
+        self.columns = [col.copy() for col in self.columns]
+        self.labels = self.labels.copy()
+        self.weights = self.weights.copy()
+        for shm in getattr(self, '_shm', []):
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+    @property
+    def nbytes(self):
+        """
+        数据集占用的字节数
+        """
+        return sum(col.nbytes for col in self.columns) + self.labels.nbytes + self.weights.nbytes
+
+class FlatTree:
+    def __init__(self, attrs, feature, threshold, is_cat, left, right, value, categories, classes=None, cat_start=None, cat_left=None):
+        """
+        编译后的扁平数组形式的CART树，节点i的信息存放在各个并行数组的第i个位置，根节点编号为0
+        :param attrs: 特征列表，feature中的索引指向该列表
+        :param feature: 划分特征的索引，叶节点为-1
+        :param threshold: 连续特征的划分阈值，离散特征不使用
+        :param is_cat: 是否按离散特征划分
+        :param left: 左子节点编号，叶节点为-1
+        :param right: 右子节点编号，叶节点为-1
+        :param value: 叶节点输出，分类为类别编码，回归为预测值
+        :param categories: 离散特征索引 -> 编码表（编码 -> 原始取值）
+        :param classes: 分类任务的类别表，回归为None
+        :param cat_start: 离散特征节点的取值集合在cat_left中的起始位置，其余节点为-1
+        :param cat_left: 所有离散特征节点的取值集合拼接成的布尔表，cat_left[cat_start[i] + 编码]表示该取值走向左子树
+        """
+        self.attrs = list(attrs)
+        self.feature = feature
+        self.threshold = threshold
+        self.is_cat = is_cat
+        self.left = left
+        self.right = right
+        self.value = value
+        self.categories = categories
+        self.classes = classes
+        self.cat_start = np.full(len(feature), -1, dtype=np.int32) if cat_start is None else cat_start
+        self.cat_left = np.zeros(0, dtype=bool) if cat_left is None else cat_left
+
+    @classmethod
+    def fromNode(cls, root: Node, attrs: list, task: str, categories=None):
+        """
+        将链式的Node树编译为扁平数组
+        param:
+            root: 根节点
+            attrs: 特征列表，决定预测数据中各列的含义
+            task: 任务类型，分类(classfication)或回归(regression)
+            categories: 离散特征的编码表（如ColumnData.categories），默认只编码树中出现过的取值；
+                        指定时直接使用该编码表，用同一编码表编译的树可以共用一次ColumnData.encode的结果
+        return:
+            flat: 扁平数组形式的树
+        """
+        # 先序遍历给节点编号
+        nodes = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            if not node.isleaf:
+                stack.append(node.right)
+                stack.append(node.left)
+        index = {id(node): i for i, node in enumerate(nodes)}
+        n = len(nodes)
+        feature = np.full(n, -1, dtype=np.int32)
+        threshold = np.zeros(n, dtype=np.float64)
+        is_cat = np.zeros(n, dtype=bool)
+        left = np.full(n, -1, dtype=np.int32)
+        right = np.full(n, -1, dtype=np.int32)
+        value = np.zeros(n, dtype=np.float64)
+        # 离散特征的编码表（未指定时）和类别表都只需要包含树中出现过的取值
+        codes = defaultdict(dict)
+        if categories is not None:
+            for j in set(attrs.index(node.feature) for node in nodes if not node.isleaf and node.classlabel == 'cat'):
+                codes[j] = {v: k for k, v in enumerate(categories[j])}
+        class_codes = {}
+        for i, node in enumerate(nodes):
+            if node.isleaf:
+                if task == 'classification':
+                    value[i] = class_codes.setdefault(node.label, len(class_codes))
+                else:
+                    value[i] = node.label
+                continue
+            j = attrs.index(node.feature)
+            feature[i] = j
+            left[i] = index[id(node.left)]
+            right[i] = index[id(node.right)]
+            if node.classlabel == 'cat':
+                is_cat[i] = True
+                for v in node.threshold:
+                    codes[j].setdefault(v, len(codes[j]))
+            else:
+                threshold[i] = node.threshold
+        # 编码表完整后再生成每个离散特征节点的取值集合
+        cat_start = np.full(n, -1, dtype=np.int32)
+        tables = []
+        offset = 0
+        for i in np.flatnonzero(is_cat):
+            table = np.zeros(len(codes[feature[i]]), dtype=bool)
+            table[[codes[feature[i]][v] for v in nodes[i].threshold]] = True
+            cat_start[i] = offset
+            offset += len(table)
+            tables.append(table)
+        cat_left = np.concatenate(tables) if tables else np.zeros(0, dtype=bool)
+        categories = {j: np.array(list(table), dtype=object) for j, table in codes.items()}
+        classes = np.array(list(class_codes)) if task == 'classification' else None
+        return cls(attrs, feature, threshold, is_cat, left, right, value, categories, classes, cat_start, cat_left)
+
+    def encode(self, data: np.ndarray)-> np.ndarray:
+        """
+        将原始数据中树用到的特征列编码为float64矩阵
+        连续特征的缺失值为nan，离散特征为取值编码，缺失或未见过的取值为-1，二者都会走向右子树
+        param:
+            data: 原始数据，列顺序与attrs一致
+        return:
+            X: 编码后的矩阵，第j列对应attrs[j]，未使用的特征列为nan
+        """
+        X = np.full((len(data), len(self.attrs)), np.nan)
+        for j in np.unique(self.feature[self.feature >= 0]):
+            if j in self.categories:
+                X[:, j] = pd.Index(self.categories[j]).get_indexer(data[:, j])
+            elif data.dtype.kind == 'f':
+                X[:, j] = data[:, j]
+            else:
+                missing = ColumnData.missingMask(data[:, j])
+                X[:, j] = np.where(missing, np.nan, data[:, j]).astype(np.float64)
+        return X
+
+    def _routing(self):
+        """
+        生成逐层下推使用的路由表（只生成一次）
+        叶节点的左右子节点都指向自身，这样所有样本可以一起走满树的深度而不必每层筛选
+        离散特征节点的upper为inf，是否走左子树由取值集合表决定
+        return:
+            feature, upper, child, depth: 路由表和树的深度
+        """
+        if getattr(self, '_route', None) is None:
+            n = len(self.feature)
+            isleaf = self.left < 0
+            ids = np.arange(n, dtype=np.int32)
+            feature = np.where(isleaf, 0, self.feature).astype(np.intp)
+            upper = np.where(isleaf | self.is_cat, inf, self.threshold)
+            child = np.empty(2 * n, dtype=np.int32)
+            child[0::2] = np.where(isleaf, ids, self.left)
+            child[1::2] = np.where(isleaf, ids, self.right)
+            # 先序编号中父节点编号总是小于子节点编号，一遍正向扫描即可得到每个节点的深度
+            depth = np.zeros(n, dtype=np.int32)
+            for i in np.flatnonzero(~isleaf):
+                depth[self.left[i]] = depth[self.right[i]] = depth[i] + 1
+            self._route = (feature, upper, child, int(depth.max()))
+        return self._route
+
+    def _stepTables(self):
+        """
+        由路由表生成apply逐层下推使用的查找表（只生成一次，不写入模型文件）
+        节点i记为2i，子节点表按(右, 左)排列，这样一层的下推只需 node = child[node + (x <= upper[node])]，
+        不需要乘2和取反；连续特征的nan比较结果为False，仍走向右子树
+        return:
+            feature, upper, child, cat_start: 按2i索引的查找表
+        """
+        if getattr(self, '_steps', None) is None:
+            feature, upper, child, depth = self._routing()
+            step_child = np.empty(len(child), dtype=np.intp)
+            step_child[0::2] = child[1::2]
+            step_child[1::2] = child[0::2]
+            step_child *= 2
+            self._steps = (np.repeat(feature.astype(np.intp), 2), np.repeat(upper, 2), step_child,
+                           np.repeat(self.cat_start.astype(np.intp), 2))
+        return self._steps
+
+    def apply(self, X: np.ndarray, chunk_size=8192)-> np.ndarray:
+        """
+        所有样本一起沿树向下移动，每一步向量化地处理一层
+        样本按块处理，每层的中间结果写入预先分配、在块之间复用的缓冲区，留在缓存中且不产生临时数组
+        param:
+            X: 编码后的矩阵；只有连续特征时可以直接传入原始的数值矩阵
+            chunk_size: 每块的样本数
+        return:
+            leaves: 每个样本所落入的叶节点编号
+        """
+        depth = self._routing()[3]
+        feature, upper, child, cat_start = self._stepTables()
+        has_cat = bool(np.any(self.is_cat))
+        cat_left = self.cat_left
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        n, d = X.shape
+        if d < len(self.attrs):
+            raise ValueError(f"X has {d} columns, expected {len(self.attrs)}")
+        values = X.ravel()
+        leaves = np.empty(n, dtype=np.intp)
+        size = min(chunk_size, n)
+        base_buf = np.arange(size, dtype=np.intp) * d
+        index_buf = np.empty(size, dtype=np.intp)
+        x_buf = np.empty(size)
+        upper_buf = np.empty(size)
+        left_buf = np.empty(size, dtype=bool)
+        for start in range(0, n, chunk_size):
+            k = min(chunk_size, n - start)
+            base, index, x, bound, go_left = base_buf[:k], index_buf[:k], x_buf[:k], upper_buf[:k], left_buf[:k]
+            chunk = values[start*d:(start+k)*d]
+            node = leaves[start:start+k]
+            node[:] = 0
+            # 下标都在范围内，mode='clip'省去越界检查和输出缓冲
+            for _ in range(depth):
+                np.take(feature, node, out=index, mode='clip')
+                index += base
+                np.take(chunk, index, out=x, mode='clip')
+                np.take(upper, node, out=bound, mode='clip')
+                np.less_equal(x, bound, out=go_left)
+                if has_cat:
+                    # 离散特征按取值编码查取值集合表，缺失或未见过的取值(-1)走向右子树
+                    offset = cat_start.take(node)
+                    at_cat = np.flatnonzero(offset >= 0)
+                    code = x.take(at_cat)
+                    go_left[at_cat] = (code >= 0) & cat_left.take(offset.take(at_cat) + np.maximum(code, 0).astype(np.intp))
+                node += go_left
+                np.take(child, node, out=node, mode='clip')
+        leaves >>= 1
+        return leaves
+
+    def predict(self, data: np.ndarray)-> np.ndarray:
+        """
+        批量预测
+        param:
+            data: 原始数据，列顺序与attrs一致
+        return:
+            y_pred: 分类为类别数组，回归为float64数组
+        """
+        # 数值矩阵且树中没有离散特征时无需编码，直接下推（nan即缺失值）
+        if isinstance(data, np.ndarray) and data.dtype.kind in 'fiu' and data.shape[1] == len(self.attrs) and not np.any(self.is_cat):
+            values = self.value[self.apply(data)]
+        else:
+            values = self.value[self.apply(self.encode(data))]
+        if self.classes is not None:
+            return self.classes[values.astype(np.intp)]
+        return values
+
+    def toArrays(self)-> tuple[str, dict, dict]:
+        """
+        导出为模型文件的内容，路由表一起导出，加载后无需重新生成
+        return:
+            kind: 模型类型
+            meta: 特征列表、离散特征的编码表、类别表和树的深度
+            arrays: 节点数组和路由表
+        """
+        feature, upper, child, depth = self._routing()
+        meta = {'attrs': self.attrs, 'categories': self.categories, 'classes': self.classes, 'depth': depth}
+        arrays = {'feature': self.feature, 'threshold': self.threshold, 'is_cat': self.is_cat, 'left': self.left,
+                  'right': self.right, 'value': self.value, 'cat_start': self.cat_start, 'cat_left': self.cat_left,
+                  'route_feature': feature, 'route_upper': upper, 'route_child': child}
+        return 'cart', meta, arrays
+
+    @classmethod
+    def fromArrays(cls, meta: dict, arrays: dict):
+        """
+        由模型文件的内容重建，数组可以是只读的memmap
+        param:
+            meta: 元数据
+            arrays: 节点数组和路由表
+        return:
+            flat: 扁平数组形式的树
+        """
+        categories = {int(j): np.array(values, dtype=object) for j, values in meta['categories'].items()}
+        classes = None if meta['classes'] is None else np.array(meta['classes'])
+        flat = cls(meta['attrs'], arrays['feature'], arrays['threshold'], arrays['is_cat'], arrays['left'],
+                   arrays['right'], arrays['value'], categories, classes, arrays['cat_start'], arrays['cat_left'])
+        flat._route = (arrays['route_feature'], arrays['route_upper'], arrays['route_child'], meta['depth'])
+        return flat
+
+register_model('cart', FlatTree)
+
+# 查找划分的子进程持有的共享数据，由_initSplitWorker在进程启动时attach
+_split_worker = {}
+
+def _initSplitWorker(meta: dict, rows_desc: tuple, weights_desc: tuple, settings: dict):
+    """
+    子进程初始化：attach共享内存中的数据集、行索引缓冲区和权重缓冲区
+    :param meta: ColumnData.share返回的描述
+    :param rows_desc: 行索引缓冲区的描述
+    :param weights_desc: 权重缓冲区的描述
+    :param settings: 父进程CART的划分参数（CART._splitSettings），子进程按同样的参数查找划分
+    """
+    _split_worker['dataset'] = ColumnData.attach(meta)
+    _split_worker['rows_shm'], _split_worker['rows'] = attach_shared_array(rows_desc)
+    _split_worker['weights_shm'], _split_worker['weights'] = attach_shared_array(weights_desc)
+    _split_worker['cart'] = CART(**settings)
+
+def _splitWorkerTask(args: tuple)-> list:
+    """
+    在子进程中对一批特征查找最优划分
+    :param args: (任务类型, 节点起始位置, 节点结束位置, 特征索引列表)
+    :return: 每个特征的(指标, 阈值)
+    """
+    task, start, end, features = args
+    rows = _split_worker['rows'][start:end]
+    weights = _split_worker['weights'][start:end]
+    cart = _split_worker['cart']
+    return [cart.chooseBestValueandThreshold(task, _split_worker['dataset'], rows, weights, i) for i in features]
 
 class CART:
-    def __init__(self, min_samples_split=100, min_impurity_decrease=1e-2, max_depth=15):
+    def __init__(self, min_samples_split=100, min_impurity_decrease=1e-2, max_depth=15, tree_method='exact', max_bins=255,
+                 n_jobs=1, parallel_min_samples=10000, max_features=None, random_state=None, criterion='sum',
+                 builder='recursive', cat_split='partition', tracer=None):
         """
         初始化CART树
         :param min_samples_split: 节点再分裂所需的最小样本数
         :param min_impurity_decrease: 分裂后最小纯度提升
         :param max_depth: 树的最大深度
+        :param tree_method: 划分查找方式，exact为逐个取值的精确划分，hist为分箱后的直方图划分
+        :param max_bins: hist模式下连续特征的最大分箱数
+        :param n_jobs: exact模式下并行查找划分的进程数，-1表示使用全部CPU
+        :param parallel_min_samples: 样本数少于该值的节点串行查找划分，避免进程通信开销超过计算量
+        :param max_features: 每次划分随机抽取的候选特征数，可为整数、比例、'sqrt'、'log2'，None表示使用全部特征
+        :param random_state: 抽取候选特征的随机种子或np.random.Generator
+        :param criterion: 划分指标，sum为左右子集不纯度之和，weighted为按权重加权的不纯度
+        :param builder: 建树方式，recursive为逐节点递归，levelwise为逐层（广度优先）批量构建
+        :param cat_split: 离散特征的划分方式，partition为按目标均值（类别比例）排序后扫描的最优二分取值集合，
+                          onehot为“等于某个取值/不等于”
+        :param tracer: 建树过程的跟踪器（BuildTracer），为None时不记录
         """
+        if tree_method not in ('exact', 'hist'):
+            raise ValueError("tree_method must be 'exact' or 'hist'")
+        if criterion not in ('sum', 'weighted'):
+            raise ValueError("criterion must be 'sum' or 'weighted'")
+        if builder not in ('recursive', 'levelwise'):
+            raise ValueError("builder must be 'recursive' or 'levelwise'")
+        if cat_split not in ('partition', 'onehot'):
+            raise ValueError("cat_split must be 'partition' or 'onehot'")
         self.root = Node()
         self.min_samples_split = min_samples_split
         self.min_impurity_decrease = min_impurity_decrease
         self.max_depth = max_depth
-    
+        self.tree_method = tree_method
+        self.max_bins = max_bins
+        self.n_jobs = n_jobs
+        self.parallel_min_samples = parallel_min_samples
+        self._pool = None
+        self._n_workers = 1
+        self.max_features = max_features
+        self.random_state = random_state
+        self.criterion = criterion
+        self.builder = builder
+        self.cat_split = cat_split
+        self.tracer = tracer
+        self._rng = None
+        self._n_candidates = None
+        self.dataset = None
+        self.task = None
+        self.flat_tree = None
+        self._compiled = None
+        # 特征 -> 建树时累计的加权不纯度下降（基于增益的特征重要性）
+        self.feature_importance = {}
+
+    def _giniFromCounts(self, counts: np.ndarray)-> np.ndarray:
+        """
+        由加权类别计数计算基尼指数，空集合的基尼指数记为1
+        param:
+            counts: 加权类别计数，最后一维为类别
+        return:
+            gini: 基尼指数
+        """
+        numEnts = np.sum(counts, axis=-1)
+        safe = np.where(numEnts > 0, numEnts, 1.0)
+        return np.where(numEnts > 0, 1.0 - np.sum(counts**2, axis=-1) / safe**2, 1.0)
+
+    def _mseFromSums(self, numEnts: np.ndarray, sums: np.ndarray, squares: np.ndarray)-> np.ndarray:
+        """
+        由加权和与加权平方和计算均方误差，空集合的均方误差记为inf
+        param:
+            numEnts: 权重和
+            sums: 标签的加权和
+            squares: 标签平方的加权和
+        return:
+            mse: 均方误差
+        """
+        safe = np.where(numEnts > 0, numEnts, 1.0)
+        # E[y^2] - E[y]^2，截断累积误差带来的微小负数
+        mse = np.maximum(squares / safe - (sums / safe)**2, 0.0)
+        return np.where(numEnts > 0, mse, inf)
 
-    def calGini(self, data: np.ndarray)-> float:
+    def _groupStats(self, task: str, dataset: ColumnData, groups: np.ndarray, n_groups: int, labels: np.ndarray, weights: np.ndarray)-> np.ndarray:
+        """
+        按组累加加权统计量
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            dataset: 列式数据集
+            groups: 每个样本的组号
+            n_groups: 组数
+            labels: 标签
+            weights: 样本权重
+        return:
+            stats: 分类为(n_groups, 类别数)的加权类别计数，回归为(n_groups, 3)的[权重和, 加权和, 加权平方和]
+        """
+        if task == 'classification':
+            n_classes = len(dataset.classes)
+            return np.bincount(groups * n_classes + labels, weights=weights,
+                               minlength=n_groups * n_classes).reshape(n_groups, n_classes)
+        return np.stack((np.bincount(groups, weights=weights, minlength=n_groups),
+                         np.bincount(groups, weights=weights*labels, minlength=n_groups),
+                         np.bincount(groups, weights=weights*labels**2, minlength=n_groups)), axis=1)
+
+    def _statsWeight(self, task: str, stats: np.ndarray)-> np.ndarray:
+        """
+        统计量对应的权重和
+        """
+        return np.sum(stats, axis=-1) if task == 'classification' else stats[..., 0]
+
+    def _impurityFromStats(self, task: str, stats: np.ndarray)-> np.ndarray:
+        """
+        由统计量计算不纯度，分类为基尼指数，回归为均方误差
+        """
+        if task == 'classification':
+            return self._giniFromCounts(stats)
+        return self._mseFromSums(stats[..., 0], stats[..., 1], stats[..., 2])
+
+    def _splitMetric(self, task: str, stats_left: np.ndarray, stats_right: np.ndarray)-> np.ndarray:
+        """
+        由左右子集的统计量计算划分指标
+        sum为左右子集不纯度之和；weighted为按权重加权的不纯度，空子集不计入
+        """
+        impurity_left = self._impurityFromStats(task, stats_left)
+        impurity_right = self._impurityFromStats(task, stats_right)
+        if self.criterion == 'sum':
+            return impurity_left + impurity_right
+        weight_left = self._statsWeight(task, stats_left)
+        weight_right = self._statsWeight(task, stats_right)
+        total = weight_left + weight_right
+        with np.errstate(invalid='ignore'):
+            return (np.where(weight_left > 0, weight_left * impurity_left, 0.0)
+                    + np.where(weight_right > 0, weight_right * impurity_right, 0.0)) / np.where(total > 0, total, 1.0)
+
+    def calGini(self, labels: np.ndarray, weights: np.ndarray)-> float:
         """
         计算基尼指数
         param:
-            data: 训练数据
+            labels: 类别编码
+            weights: 样本权重
         return:
             gini: 基尼指数
         """
-        numEnts = np.sum(data[:, -2])
-        labelCounts = defaultdict(int)
-        labellist = set(data[:, -1])
-        for label in labellist:
-            labelCounts[label] = np.sum(data[data[:, -1] == label, -2])
-        gini = 1.0
-        for key in labelCounts:
-            prob = float(labelCounts[key])/numEnts
-            gini -= prob*prob
-        return gini
+        return float(self._giniFromCounts(np.bincount(labels, weights=weights)))
 
-    def calMse(self, data: np.ndarray)-> tuple[float,float]:
+    def calMse(self, labels: np.ndarray, weights: np.ndarray)-> tuple[float,float]:
         """
         计算均方误差
         param:
-            data: 训练数据
+            labels: 标签
+            weights: 样本权重
         return:
             mse: 均方误差
             y_pred: 预测值
         """
-        numEnts = np.sum(data[:, -2])
-        if numEnts == 0 or len(data) == 0:
+        numEnts = np.sum(weights)
+        if numEnts == 0 or len(labels) == 0:
             return float('inf'), 0.0
-        y_pred = np.sum(data[:, -1]*data[:, -2]) / numEnts
-        mse = np.sum((data[:, -1] - y_pred)**2*data[:,-2]) / numEnts
-        return mse, y_pred
+        y_pred = np.sum(labels*weights) / numEnts
+        mse = np.sum((labels - y_pred)**2*weights) / numEnts
+        return float(mse), float(y_pred)
 
+    @traced('leaf')
+    def leafLabel(self, task: str, dataset: ColumnData, rows: np.ndarray, weights: np.ndarray):
+        """
+        计算叶节点的输出
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            dataset: 列式数据集
+            rows: 节点样本的行索引
+            weights: 节点样本的权重
+        return:
+            label: 分类为加权多数类别，回归为加权均值
+        """
+        labels = dataset.labels[rows]
+        if task == 'classification':
+            return dataset.classes[np.argmax(np.bincount(labels, weights=weights))]
+        _, y_pred = self.calMse(labels, weights)
+        return y_pred
 
-    def splitDataSetWithNull(self, data: np.ndarray, attrIndex: int, threshold, attrs_type: str)-> tuple[np.ndarray, np.ndarray]:
+    @traced('partition')
+    def splitDataSetWithNull(self, dataset: ColumnData, start: int, end: int, attrIndex: int, threshold)-> tuple[int, int, float, float]:
         """
-        根据属性阈值划分含有缺失值的数据集
+        根据属性阈值原地划分共享行索引缓冲区中[start, end)这一段
+        划分后该段排列为 [左子树样本 | 缺失样本 | 右子树样本]，左子树对应[start, start+n_left+n_missing)，
+        右子树对应[start+n_left, end)，缺失样本同时属于左右子树，权重按左右非缺失样本的权重比例缩放
         param:
-            data: 训练数据
+            dataset: 列式数据集
+            start: 节点在缓冲区中的起始位置
+            end: 节点在缓冲区中的结束位置
             attrIndex: 特征索引
-            threshold: 分割阈值
-            attrs_type: 特征类型
-        return: 
-            data_left: 左子树数据
-            data_right: 右子树数据
-        """
-        
-        data_nan = data[data[:, attrIndex] == NAN]
-        data_not_nan = data[data[:, attrIndex] != NAN]
-        
+            threshold: 分割阈值，离散特征为左子树的取值编码集合
+        return:
+            n_left: 左侧非缺失样本数
+            n_missing: 缺失样本数
+            scale_left: 缺失样本进入左子树时的权重缩放系数
+            scale_right: 缺失样本进入右子树时的权重缩放系数
+        """
+        rows = self._rows[start:end]
+        weights = self._weights[start:end]
+        values = dataset.columns[attrIndex][rows]
+        missing = dataset.isMissing(attrIndex, values)
         # 连续特征
-        if attrs_type == 'num':
-            left = data_not_nan[data_not_nan[:, attrIndex] <= threshold]
-            right = data_not_nan[data_not_nan[:, attrIndex] > threshold]
+        if dataset.attrs_type[attrIndex] == 1:
+            go_left = values <= threshold
         # 离散特征
-        elif attrs_type == 'cat':
-            left = data_not_nan[data_not_nan[:, attrIndex] == threshold]
-            right = data_not_nan[data_not_nan[:, attrIndex] != threshold]
         else:
-            raise ValueError("attrs_type must be 'num' or 'cat'")
-        
-        # 输出结果
-        data_left = np.concatenate((left, data_nan), axis=0) if len(data_nan) > 0 and len(left) > 0 else left if len(left) > 0 else data_nan if len(data_nan) > 0 else np.empty((0, data.shape[1]))
-        data_right = np.concatenate((right, data_nan), axis=0) if len(data_nan) > 0 and len(right) > 0 else right if len(right) > 0 else data_nan if len(data_nan) > 0 else np.empty((0, data.shape[1]))
-        
-        if len(data_nan) != 0 and (len(left) > 0 or len(right) > 0):
-            total_weight = np.sum(left[:, -2]) + np.sum(right[:, -2]) if len(left) > 0 and len(right) > 0 else np.sum(left[:, -2]) if len(left) > 0 else np.sum(right[:, -2])
-            if len(left) > 0:
-                left_weight = np.sum(left[:, -2]) / total_weight
-                data_left[np.where(data_left[:, attrIndex] == NAN), -2] = data_left[np.where(data_left[:, attrIndex] == NAN), -2] * left_weight
-            if len(right) > 0:
-                right_weight = np.sum(right[:, -2]) / total_weight
-                data_right[np.where(data_right[:, attrIndex] == NAN), -2] = data_right[np.where(data_right[:, attrIndex] == NAN), -2] * right_weight
-        
-        # 删除特征列
-        if attrs_type == 'cat':
-            data_left = np.delete(data_left, attrIndex, axis=1)
-        
-        return data_left, data_right
-
-    def isSame(self, data: np.ndarray)-> bool:
+            go_left = np.isin(values, threshold)
+        go_right = ~go_left & ~missing
+        order = np.concatenate((np.flatnonzero(go_left), np.flatnonzero(missing), np.flatnonzero(go_right)))
+        self._rows[start:end] = rows[order]
+        self._weights[start:end] = weights[order]
+        n_left = int(np.count_nonzero(go_left))
+        n_missing = int(np.count_nonzero(missing))
+        # 某一侧没有非缺失样本时，缺失样本以原权重进入该侧
+        weight_left = np.sum(self._weights[start:start+n_left])
+        weight_right = np.sum(self._weights[start+n_left+n_missing:end])
+        total_weight = weight_left + weight_right
+        scale_left = weight_left / total_weight if n_left > 0 else 1.0
+        scale_right = weight_right / total_weight if end - start - n_left - n_missing > 0 else 1.0
+        return n_left, n_missing, scale_left, scale_right
+
+    @traced('is_same')
+    def isSame(self, dataset: ColumnData, rows: np.ndarray, features: list)-> bool:
         """
         判断数据集属性取值是否一致
         param:
-            data: 训练数据
+            dataset: 列式数据集
+            rows: 节点样本的行索引
+            features: 可用的特征索引
         return:
             True or False
         """
-        # 获取特征列数（排除最后两列：标签列和权重列）
-        n_features = data.shape[1] - 2
-        
-        # 如果没有特征列，返回True
-        if n_features <= 0:
-            return True
-            
-        # 取第一行作为参考
-        first_row = data[0, :n_features]
-        
-        # 比较每一行与第一行是否相同
-        for i in range(1, data.shape[0]):
-            current_row = data[i, :n_features]
-            # 如果任何一行与第一行不同，返回False
-            if not np.array_equal(first_row, current_row):
+        for j in features:
+            values = dataset.columns[j][rows]
+            missing = dataset.isMissing(j, values)
+            # 缺失与缺失视为相同
+            if missing[0]:
+                if not np.all(missing):
+                    return False
+            elif np.any(values != values[0]):
                 return False
-                
-        # 所有行都相同，返回True
         return True
 
-    def chooseBestValueandThreshold(self, task: str, data: np.ndarray, index: int, attrs_type: list)-> tuple[float, str or float]:
+    def sortedSweep(self, task: str, values: np.ndarray, labels: np.ndarray, weights: np.ndarray)-> tuple[float, float]:
+        """
+        连续特征的排序扫描划分：特征只排序一次，用累积量一遍算出所有候选划分点的指标
+        分类使用累积的加权类别计数计算左右基尼指数，回归使用累积的加权和与加权平方和计算左右均方误差
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            values: 非缺失样本的特征取值
+            labels: 非缺失样本的标签
+            weights: 非缺失样本的权重
+        return:
+            bestcalmetric: 最优划分指标（左右子集指标之和）
+            bestthreshold: 最优划分阈值
+        """
+        order = np.argsort(values, kind='stable')
+        values = values[order]
+        labels = labels[order]
+        weights = weights[order]
+        # 候选划分点位于相邻两个不同取值之间，cut[j]为左子集最后一个样本的位置
+        cut = np.flatnonzero(values[1:] != values[:-1])
+        if len(cut) == 0:
+            return inf, None
+        if task == 'classification':
+            stats = np.zeros((len(values), labels.max() + 1))
+            stats[np.arange(len(values)), labels] = weights
+        elif task == 'regression':
+            stats = np.stack((weights, weights*labels, weights*labels**2), axis=1)
+        else:
+            raise ValueError("task must be 'classification' or 'regression'")
+        stats_left = np.cumsum(stats, axis=0)[cut]
+        stats_right = np.sum(stats, axis=0) - stats_left
+        calmetric = self._splitMetric(task, stats_left, stats_right)
+        # argmin取第一个最小值，与按升序逐个比较时的严格小于一致
+        best = np.argmin(calmetric)
+        return float(calmetric[best]), float((values[cut[best]] + values[cut[best] + 1]) / 2)
+
+    def chooseBestValueandThreshold(self, task: str, dataset: ColumnData, rows: np.ndarray, weights: np.ndarray, index: int)-> tuple[float, float or np.ndarray]:
         """
         选择最优划分属性
         param:
             task: 任务类型，分类(classfication)或回归(regression)
-            data: 训练数据
+            dataset: 列式数据集
+            rows: 节点样本的行索引
+            weights: 节点样本的权重
             index: 特征索引
-            attrs_type: 特征类型
         return:
-            bestthreshold: 最优划分阈值
             bestcalmetric: 最优划分指标
+            bestthreshold: 最优划分阈值，离散特征为左子树的取值编码集合
         """
-        uniqueVals = list(set(data[:, index]))
-        bestthreshold = None
-        bestcalmetric = inf
-        if NAN in uniqueVals:
-            uniqueVals.remove(NAN)
-            subdata = data[np.where(data[:, index] != NAN)]
-        else:
-            subdata = copy.copy(data)
+        values = dataset.columns[index][rows]
+        present = ~dataset.isMissing(index, values)
+        values = values[present]
+        labels = dataset.labels[rows][present]
+        weights = weights[present]
+        if len(values) == 0:
+            return inf, None
         # 连续特征
-        if attrs_type[index] == 1:
+        if dataset.attrs_type[index] == 1:
             # 只有一个取值，只有左子数没有右子树
-            if len(uniqueVals) == 1:
-                subdata_left = subdata[np.where(subdata[:, index] <= uniqueVals[0])]
+            if np.all(values == values[0]):
                 if task == 'classification':
-                    bestthreshold = uniqueVals[0]
-                    bestcalmetric = self.calGini(subdata_left)
+                    return self.calGini(labels, weights), float(values[0])
                 elif task == 'regression':
-                    bestcalmetric, bestthreshold = self.calMse(subdata_left)
-            else:
-                for j in range(len(uniqueVals)-1):
-                        threshold = (uniqueVals[j] + uniqueVals[j+1]) / 2
-                        subdata_left = subdata[np.where(subdata[:, index] <= threshold)]
-                        subdata_right = subdata[np.where(subdata[:, index] > threshold)]
-                        if task == 'classification':
-                            calmetric = self.calGini(subdata_left) + self.calGini(subdata_right)
-                        elif task == 'regression':
-                            calmetric_L, _ = self.calMse(subdata_left) 
-                            calmetric_R, _ = self.calMse(subdata_right)
-                            calmetric = calmetric_L + calmetric_R
-                        if calmetric < bestcalmetric:
-                            bestcalmetric = calmetric
-                            bestthreshold = threshold
-        # 离散特征
-        elif attrs_type[index] == 0:
-            for j in range(len(uniqueVals)):
-                threshold = uniqueVals[j]
-                subdata_left = subdata[np.where(subdata[:, index] == uniqueVals[j])]
-                subdata_right = subdata[np.where(subdata[:, index] != uniqueVals[j])]
-                if task == 'classification':
-                    calmetric = self.calGini(subdata_left) + self.calGini(subdata_right)
-                elif task =='regression':
-                    calmetric_L, _ = self.calMse(subdata_left)
-                    calmetric_R, _ = self.calMse(subdata_right)
-                    calmetric = calmetric_L + calmetric_R
-                if calmetric < bestcalmetric:
-                    bestcalmetric = calmetric
-                    bestthreshold = threshold
-        return bestcalmetric, bestthreshold
-
-    def chooseBestFeature(self, task: str, data: np.ndarray, attrs_type: list)-> tuple[float, int]:
+                    mse, _ = self.calMse(labels, weights)
+                    return mse, float(values[0])
+            # 排序一次后一遍扫描所有相邻取值的中点
+            return self.sortedSweep(task, values, labels, weights)
+        # 离散特征：一次分组统计出每个取值的加权量，再查找最优的取值集合划分
+        stats = self._groupStats(task, dataset, values, len(dataset.categories[index]), labels, weights)
+        return self.categoricalSplit(task, stats)
+
+    def categoricalSplit(self, task: str, stats: np.ndarray)-> tuple[float, np.ndarray]:
+        """
+        离散特征的划分
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            stats: 每个取值的统计量
+        return:
+            bestcalmetric: 最优划分指标
+            bestthreshold: 左子树的取值编码集合，没有可用划分时为None
+        """
+        metric, left_mask = self.categoricalPartition(task, stats[None])
+        if not np.isfinite(metric[0]):
+            return inf, None
+        return float(metric[0]), np.flatnonzero(left_mask[0])
+
+    def categoricalPartition(self, task: str, stats: np.ndarray)-> tuple[np.ndarray, np.ndarray]:
+        """
+        多个节点一起查找离散特征的最优划分
+        partition：按取值的加权目标均值（分类为节点中最多的类别在该取值中的比例）排序，
+        最优的二分取值集合一定是该顺序的某个前缀，排序后一遍扫描即可，复杂度O(k log k)；
+        onehot：逐个取值计算“等于/不等于”划分的指标
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            stats: (节点数, 取值数, 统计量)，每个节点每个取值的统计量
+        return:
+            metric: 每个节点的最优划分指标，没有可用划分时为inf
+            left_mask: (节点数, 取值数)，走向左子树的取值
+        """
+        n_nodes, n_values = stats.shape[:2]
+        weight = self._statsWeight(task, stats)
+        present = weight > 0
+        total = np.sum(stats, axis=1, keepdims=True)
+        if self.cat_split == 'onehot':
+            calmetric = np.where(present, self._splitMetric(task, stats, total - stats), inf)
+            best = np.argmin(calmetric, axis=1)
+            left_mask = np.zeros((n_nodes, n_values), dtype=bool)
+            left_mask[np.arange(n_nodes), best] = True
+            return calmetric[np.arange(n_nodes), best], left_mask
+        safe = np.where(present, weight, 1.0)
+        if task == 'classification':
+            major = np.argmax(total[:, 0], axis=1)
+            key = stats[np.arange(n_nodes), :, major] / safe
+        else:
+            key = stats[..., 1] / safe
+        # 不存在的取值排在最后，不参与划分
+        order = np.argsort(np.where(present, key, inf), axis=1, kind='stable')
+        stats_left = np.cumsum(np.take_along_axis(stats, order[..., None], axis=1), axis=1)
+        calmetric = self._splitMetric(task, stats_left, total - stats_left)
+        # 前缀长度为1..m-1时左右两侧都有取值
+        n_present = np.count_nonzero(present, axis=1)
+        calmetric = np.where(np.arange(n_values)[None, :] < (n_present - 1)[:, None], calmetric, inf)
+        best = np.argmin(calmetric, axis=1)
+        rank = np.empty_like(order)
+        np.put_along_axis(rank, order, np.arange(n_values)[None, :].repeat(n_nodes, axis=0), axis=1)
+        left_mask = (rank <= best[:, None]) & present
+        return calmetric[np.arange(n_nodes), best], left_mask
+
+    def histogramSplit(self, task: str, stats: np.ndarray, upper: np.ndarray)-> tuple[float, float]:
+        """
+        连续特征在直方图上的划分：累加各分箱的统计量，一遍扫描所有分箱边界
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            stats: 各非缺失分箱的统计量
+            upper: 各分箱的上界
+        return:
+            bestcalmetric: 最优划分指标
+            bestthreshold: 最优划分阈值（左侧分箱的上界）
+        """
+        nonempty = np.flatnonzero(self._statsWeight(task, stats) > 0)
+        if len(nonempty) == 0:
+            return inf, None
+        # 只有一个非空分箱，只有左子数没有右子树
+        if len(nonempty) == 1:
+            return float(self._impurityFromStats(task, stats[nonempty[0]])), float(upper[nonempty[0]])
+        # 候选划分点位于相邻两个非空分箱之间
+        stats = stats[nonempty]
+        stats_left = np.cumsum(stats, axis=0)[:-1]
+        stats_right = np.sum(stats, axis=0) - stats_left
+        calmetric = self._splitMetric(task, stats_left, stats_right)
+        best = np.argmin(calmetric)
+        return float(calmetric[best]), float(upper[nonempty[best]])
+
+    @traced('histogram')
+    def buildHistogram(self, task: str, dataset: ColumnData, start: int, end: int, features: list)-> dict:
+        """
+        直接统计共享缓冲区中[start, end)这一段样本在各特征分箱上的直方图
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            dataset: 列式数据集（已分箱）
+            start: 起始位置
+            end: 结束位置
+            features: 可用的特征索引
+        return:
+            hist: 特征索引 -> 各分箱（最后一个为缺失箱）的统计量
+        """
+        rows = self._rows[start:end]
+        weights = self._weights[start:end]
+        labels = dataset.labels[rows]
+        return {j: self._groupStats(task, dataset, dataset.bins[j][rows].astype(np.intp), dataset.n_bins[j] + 1, labels, weights)
+                for j in features}
+
+    @traced('histogram')
+    def subtractHistogram(self, task: str, hist_parent: dict, hist_child: dict)-> dict:
+        """
+        兄弟节点直方图 = 父节点直方图 - 子节点直方图
+        相减留下的舍入误差会被当作非空分箱，按父节点权重的相对量清零
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            hist_parent: 父节点直方图
+            hist_child: 已直接统计的子节点直方图
+        return:
+            hist_sibling: 兄弟节点直方图
+        """
+        hist_sibling = {}
+        for j, stats in hist_child.items():
+            sibling = hist_parent[j] - stats
+            weight = self._statsWeight(task, sibling)
+            sibling[weight <= 1e-9 * np.sum(self._statsWeight(task, hist_parent[j]))] = 0.0
+            hist_sibling[j] = sibling
+        return hist_sibling
+
+    def chooseBestBin(self, task: str, dataset: ColumnData, stats: np.ndarray, index: int)-> tuple[float, float or np.ndarray]:
+        """
+        hist模式下选择单个特征的最优划分，缺失箱不参与划分
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            dataset: 列式数据集（已分箱）
+            stats: 该特征在节点上的直方图
+            index: 特征索引
+        return:
+            bestcalmetric: 最优划分指标
+            bestthreshold: 最优划分阈值，离散特征为左子树的取值编码集合
+        """
+        if dataset.attrs_type[index] == 1:
+            return self.histogramSplit(task, stats[:-1], dataset.bin_upper[index])
+        return self.categoricalSplit(task, stats[:-1])
+
+    @traced('split_search', count='features')
+    def chooseBestFeature(self, task: str, dataset: ColumnData, start: int, end: int, features: list, hist=None)-> tuple[float, int]:
         """
         选择最优划分属性
+        exact模式下样本数不少于parallel_min_samples的节点把特征分批交给进程池，
+        子进程直接读共享内存中的数据集和缓冲区段[start, end)，结果按特征顺序合并，与串行结果一致
         param:
             task: 任务类型，分类(classfication)或回归(regression)
-            data: 训练数据
-            attrs_type: 特征类型
+            dataset: 列式数据集
+            start: 节点在缓冲区中的起始位置
+            end: 节点在缓冲区中的结束位置
+            features: 可用的特征索引
+            hist: hist模式下节点的直方图，exact模式为None
         return:
             bestthreshold: 最优划分阈值
             bestfeatureIndex: 最优划分属性索引
         """
-        featureNum = data.shape[1] - 2
-        threshold = 0
-        bestfeatureIndex = 0
+        bestfeatureIndex = features[0]
         bestthreshold = None
-        metric = 0
         bestmetric = inf
 
-        for i in range(featureNum):
-            metric, threshold = self.chooseBestValueandThreshold(task, data, i, attrs_type)
+        if hist is not None:
+            results = [self.chooseBestBin(task, dataset, hist[i], i) for i in features]
+        elif self._pool is not None and end - start >= self.parallel_min_samples and len(features) > 1:
+            batches = [list(batch) for batch in np.array_split(features, min(self._n_workers, len(features)))]
+            results = [result for batch in self._pool.map(_splitWorkerTask, [(task, start, end, batch) for batch in batches])
+                       for result in batch]
+        else:
+            rows = self._rows[start:end]
+            weights = self._weights[start:end]
+            results = [self.chooseBestValueandThreshold(task, dataset, rows, weights, i) for i in features]
+
+        for i, (metric, threshold) in zip(features, results):
             if metric < bestmetric:
                 bestmetric = metric
                 bestfeatureIndex = i
                 bestthreshold = threshold
         return bestthreshold, bestfeatureIndex
-           
-                    
-    
-    def buildTree(self, task: str, data: np.ndarray, attrs: list, attrs_type: list, depth = 1)-> Node:
+
+
+
+    def sampleFeatures(self, features: list)-> list:
+        """
+        每次划分随机抽取候选特征（随机森林），未设置max_features时返回全部特征
+        param:
+            features: 可用的特征索引
+        return:
+            candidates: 候选特征索引，保持原有顺序
+        """
+        if self._n_candidates is None or self._n_candidates >= len(features):
+            return features
+        chosen = self._rng.choice(len(features), self._n_candidates, replace=False)
+        return [features[k] for k in np.sort(chosen)]
+
+    def _resolveMaxFeatures(self, n_features: int):
+        """
+        将max_features换算为候选特征数
+        param:
+            n_features: 特征总数
+        return:
+            n_candidates: 候选特征数，None表示使用全部特征
+        """
+        if self.max_features is None:
+            return None
+        if self.max_features == 'sqrt':
+            return max(1, int(np.sqrt(n_features)))
+        if self.max_features == 'log2':
+            return max(1, int(np.log2(n_features)))
+        if isinstance(self.max_features, float):
+            return max(1, int(self.max_features * n_features))
+        return max(1, int(self.max_features))
+
+    @traced('impurity')
+    def calImpurity(self, task: str, dataset: ColumnData, start: int, end: int)-> float:
+        """
+        计算共享缓冲区中[start, end)这一段样本的不纯度
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            dataset: 列式数据集
+            start: 起始位置
+            end: 结束位置
+        return:
+            impurity: 分类为基尼指数，回归为均方误差
+        """
+        labels = dataset.labels[self._rows[start:end]]
+        if task == 'classification':
+            return self.calGini(labels, self._weights[start:end])
+        impurity, _ = self.calMse(labels, self._weights[start:end])
+        return impurity
+
+    @traced('node', node=True)
+    def buildTree(self, task: str, dataset: ColumnData, start: int, end: int, features: list, depth = 1, hist=None)-> Node:
         """
         递归构建CART树
+        所有节点共享同一份特征列和同一个行索引缓冲区(self._rows)及权重缓冲区(self._weights)，
+        节点只持有缓冲区中的一段[start, end)，划分时在该段内原地重排
         param:
             task: 任务类型，分类(classfication)或回归(regression)
-            data: 训练数据
-            attrs: 特征列表
-            attrs_type: 特征类型
+            dataset: 列式数据集
+            start: 节点在缓冲区中的起始位置
+            end: 节点在缓冲区中的结束位置
+            features: 可用的特征索引
             depth: 树的深度
+            hist: hist模式下由父节点传下来的直方图，为None时直接统计
         return:
             node: 树节点
         """
-        classlist = data[:, -1]
+        rows = self._rows[start:end]
+        weights = self._weights[start:end]
+        cover = float(np.sum(weights))
+        classlist = dataset.labels[rows]
         if task == 'classification':
             # 类别完全相同，停止划分
-            if len(set(classlist)) == 1:
+            if np.all(classlist == classlist[0]):
                 node = Node()
-                node.label = classlist[0]
+                node.label = dataset.classes[classlist[0]]
                 node.isleaf = True
+                node.weight = cover
                 return node
-            
+
         elif task == 'regression':
             # 样本数量收敛，停止划分
-            if len(data) <= self.min_samples_split:
+            if len(rows) <= self.min_samples_split:
                 node = Node()
-                node.label = np.mean(classlist)
+                node.label = self.leafLabel(task, dataset, rows, weights)
                 node.isleaf = True
+                node.weight = cover
                 return node
-        # 所有特征均已使用，返回出现次数最多的类别
-        if len(attrs) == 0:
+        # 所有特征均已使用，所有样本相同，或达到最大深度（预剪枝），返回叶节点
+        if (len(features) == 0 or self.isSame(dataset, rows, features)
+                or (self.max_depth is not None and depth > self.max_depth)):
             node = Node()
-            if task == 'classification':
-                node.label = max(set(classlist), key=classlist.tolist().count)
-            elif task == 'regression':
-                node.label = np.mean(classlist)
+            node.label = self.leafLabel(task, dataset, rows, weights)
             node.isleaf = True
+            node.weight = cover
             return node
-        # 所有样本相同，返回出现次数最多的类别
-        if self.isSame(data):
+
+        # 选择最优划分属性
+        if self.tree_method == 'hist' and hist is None:
+            hist = self.buildHistogram(task, dataset, start, end, features)
+        bestthreshold, bestfeatureIndex = self.chooseBestFeature(task, dataset, start, end, self.sampleFeatures(features), hist)
+        if bestthreshold is None:
             node = Node()
-            if task == 'classification':
-                node.label = max(set(classlist), key=classlist.tolist().count)
-            elif task =='regression':
-                node.label = np.mean(classlist)
+            node.label = self.leafLabel(task, dataset, rows, weights)
             node.isleaf = True
+            node.weight = cover
             return node
 
-        # 预剪枝条件：最大深度
-        if self.max_depth is not None and depth > self.max_depth:
+        # 原地划分：[start, mid)为左侧样本，[mid, mid+n_missing)为缺失样本，其余为右侧样本
+        impurity_parent = self.calImpurity(task, dataset, start, end)
+        n_left, n_missing, scale_left, scale_right = self.splitDataSetWithNull(dataset, start, end, bestfeatureIndex, bestthreshold)
+        mid = start + n_left
+        # 缺失样本被左子树重排前先保存一份，构建右子树前再放回
+        missing_rows = self._rows[mid:mid+n_missing].copy()
+        missing_weights = self._weights[mid:mid+n_missing].copy()
+
+        # 预剪枝条件：分裂提升不足，或某一侧没有样本（直方图上只有一个非空分箱时会出现）
+        self._weights[mid:mid+n_missing] = missing_weights * scale_right
+        impurity_right = self.calImpurity(task, dataset, mid, end)
+        self._weights[mid:mid+n_missing] = missing_weights * scale_left
+        impurity_left = self.calImpurity(task, dataset, start, mid+n_missing)
+        n = end - start
+        impurity_decrease = impurity_parent - ((n_left+n_missing)/n)*impurity_left - ((end-mid)/n)*impurity_right
+        if impurity_decrease < self.min_impurity_decrease or n_left + n_missing == 0 or end == mid:
+            self._weights[mid:mid+n_missing] = missing_weights
             node = Node()
-            if task == 'classification':
-                node.label = max(set(classlist), key=classlist.tolist().count)
-            elif task == 'regression':
-                node.label = np.mean(classlist)
+            node.label = self.leafLabel(task, dataset, rows, weights)
             node.isleaf = True
+            node.weight = cover
             return node
 
-        # 选择最优划分属性
-        bestthreshold, bestfeatureIndex = self.chooseBestFeature(task, data, attrs_type)
-
-        # 预剪枝条件：分裂提升不足
-        if task == 'classification':
-            impurity_parent = self.calGini(data)
-            data_left, data_right = self.splitDataSetWithNull(data, bestfeatureIndex, bestthreshold, "cat" if attrs_type[bestfeatureIndex]==0 else "num")
-            impurity_left = self.calGini(data_left)
-            impurity_right = self.calGini(data_right)
-            impurity_decrease = impurity_parent - (len(data_left)/len(data))*impurity_left - (len(data_right)/len(data))*impurity_right
-            if impurity_decrease < self.min_impurity_decrease :
-                node = Node()
-                node.label = max(set(classlist), key=classlist.tolist().count)
-                node.isleaf = True
-                return node
-        elif task == 'regression':
-            impurity_parent, _ = self.calMse(data)
-            data_left, data_right = self.splitDataSetWithNull(data, bestfeatureIndex, bestthreshold, "cat" if attrs_type[bestfeatureIndex]==0 else "num")
-            impurity_left, _ = self.calMse(data_left)
-            impurity_right, _ = self.calMse(data_right)
-            impurity_decrease = impurity_parent - (len(data_left)/len(data))*impurity_left - (len(data_right)/len(data))*impurity_right
-            if impurity_decrease < self.min_impurity_decrease :
-                node = Node()
-                node.label = np.mean(classlist)
-                node.isleaf = True
-                return node
-
-        # 创建分支节点
+        # 创建分支节点，分裂带来的加权不纯度下降计入该特征的重要性
         node = Node()
-        node.feature = attrs[bestfeatureIndex]
-        node.threshold = bestthreshold
+        node.feature = dataset.attrs[bestfeatureIndex]
+        node.weight = cover
+        self.feature_importance[node.feature] += cover * impurity_decrease
 
         # 离散特征
-        if attrs_type[bestfeatureIndex] == 0:
+        if dataset.attrs_type[bestfeatureIndex] == 0:
             node.classlabel = 'cat'
-            # 划分数据集
-            data_left, data_right = self.splitDataSetWithNull(data, bestfeatureIndex, bestthreshold, "cat")
-            # 递归构建子树
-            attrs_left = attrs[:bestfeatureIndex] + attrs[bestfeatureIndex+1:]
-            attrs_type_left = attrs_type[:bestfeatureIndex] + attrs_type[bestfeatureIndex+1:]
-            node.left = self.buildTree(task, data_left, attrs_left, attrs_type_left,depth+1)
-            node.right = self.buildTree(task, data_right, attrs, attrs_type, depth+1)
-
+            node.threshold = set(dataset.categories[bestfeatureIndex][bestthreshold])
+            # 左子树取值唯一时不再使用该特征
+            features_left = [i for i in features if i != bestfeatureIndex] if len(bestthreshold) == 1 else features
         # 连续特征
-        elif attrs_type[bestfeatureIndex] == 1:
+        elif dataset.attrs_type[bestfeatureIndex] == 1:
             node.classlabel = 'num'
-            # 划分数据集
-            data_left, data_right = self.splitDataSetWithNull(data, bestfeatureIndex, bestthreshold, "num")
-            # 递归构建子树
-            node.left = self.buildTree(task, data_left, attrs, attrs_type, depth+1)
-            node.right = self.buildTree(task, data_right, attrs, attrs_type, depth+1)
+            node.threshold = bestthreshold
+            features_left = features
+
+        # hist模式：样本少的子节点直接统计直方图，另一个由父节点直方图相减得到
+        # 两侧都有非缺失样本时缩放系数之和为1，左右直方图之和恰好等于父节点直方图
+        hist_left = hist_right = None
+        if hist is not None and n_left > 0 and end - mid - n_missing > 0:
+            if n_left + n_missing <= end - mid:
+                hist_left = self.buildHistogram(task, dataset, start, mid+n_missing, features)
+                hist_right = self.subtractHistogram(task, hist, hist_left)
+            else:
+                self._weights[mid:mid+n_missing] = missing_weights * scale_right
+                hist_right = self.buildHistogram(task, dataset, mid, end, features)
+                hist_left = self.subtractHistogram(task, hist, hist_right)
+                self._weights[mid:mid+n_missing] = missing_weights * scale_left
+        hist = None
+        node.left = self.buildTree(task, dataset, start, mid+n_missing, features_left, depth+1, hist_left)
+        self._rows[mid:mid+n_missing] = missing_rows
+        self._weights[mid:mid+n_missing] = missing_weights * scale_right
+        node.right = self.buildTree(task, dataset, mid, end, features, depth+1, hist_right)
         return node
-        
+
+
+    @traced('is_same')
+    def levelSame(self, dataset: ColumnData, node: np.ndarray, rows: np.ndarray, n_nodes: int, avail: np.ndarray)-> np.ndarray:
+        """
+        同一层所有节点一起判断属性取值是否一致，缺失与缺失视为相同
+        param:
+            dataset: 列式数据集
+            node: 每个样本所属的节点编号
+            rows: 样本的行索引
+            n_nodes: 节点数
+            avail: (节点数, 特征数)的可用特征掩码
+        return:
+            same: 每个节点的样本在可用特征上是否完全相同
+        """
+        same = np.ones(n_nodes, dtype=bool)
+        size = np.bincount(node, minlength=n_nodes)
+        for j in range(len(dataset.attrs)):
+            in_node = avail[node, j]
+            if not np.any(in_node):
+                continue
+            values = dataset.columns[j][rows[in_node]]
+            node_j = node[in_node]
+            missing = dataset.isMissing(j, values)
+            n_missing = np.bincount(node_j, weights=missing, minlength=n_nodes)
+            lower = np.full(n_nodes, inf)
+            upper = np.full(n_nodes, -inf)
+            np.minimum.at(lower, node_j[~missing], values[~missing])
+            np.maximum.at(upper, node_j[~missing], values[~missing])
+            differ = ((n_missing > 0) & (n_missing < size)) | ((n_missing == 0) & (upper > lower))
+            same &= ~(differ & avail[:, j])
+        return same
+
+    @traced('split_search', count='index')
+    def levelSplit(self, task: str, dataset: ColumnData, index: int, node: np.ndarray, rows: np.ndarray, weights: np.ndarray,
+                   n_nodes: int)-> tuple[np.ndarray, np.ndarray]:
+        """
+        同一层所有节点一起查找某个特征上的最优划分，与逐节点的划分查找结果一致
+        连续特征按(节点, 取值)排序后分段累加，hist模式按(节点, 分箱)统计；离散特征按(节点, 取值)统计
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            dataset: 列式数据集
+            index: 特征索引
+            node: 每个样本所属的节点编号
+            rows: 样本的行索引
+            weights: 样本的权重
+            n_nodes: 节点数
+        return:
+            metric: 每个节点的最优划分指标，没有可用划分时为inf
+            threshold: 每个节点的最优划分阈值，离散特征为(节点数, 取值数)的左子树取值掩码
+        """
+        metric = np.full(n_nodes, inf)
+        threshold = np.full(n_nodes, np.nan)
+        values = dataset.columns[index][rows]
+        present = ~dataset.isMissing(index, values)
+        node = node[present]
+        values = values[present]
+        labels = dataset.labels[rows[present]]
+        weights = weights[present]
+        if len(values) == 0:
+            if dataset.attrs_type[index] == 0:
+                threshold = np.zeros((n_nodes, len(dataset.categories[index])), dtype=bool)
+            return metric, threshold
+        # 离散特征：按(节点, 取值)统计后一起查找最优的取值集合划分
+        if dataset.attrs_type[index] == 0:
+            n_values = len(dataset.categories[index])
+            stats = self._groupStats(task, dataset, node * n_values + values, n_nodes * n_values, labels, weights)
+            return self.categoricalPartition(task, stats.reshape(n_nodes, n_values, -1))
+        # hist模式的连续特征：累加各分箱的统计量，候选边界位于非空分箱之后且右侧还有非空分箱
+        if self.tree_method == 'hist':
+            n_bins = dataset.n_bins[index]
+            upper = dataset.bin_upper[index]
+            bins = dataset.bins[index][rows[present]].astype(np.intp)
+            stats = self._groupStats(task, dataset, node * n_bins + bins, n_nodes * n_bins, labels, weights)
+            stats = stats.reshape(n_nodes, n_bins, -1)
+            nonempty = self._statsWeight(task, stats) > 0
+            stats_left = np.cumsum(stats, axis=1)
+            stats_right = stats_left[:, -1:] - stats_left
+            n_after = np.cumsum(nonempty[:, ::-1], axis=1)[:, ::-1]
+            calmetric = np.where(nonempty & (n_after > 1), self._splitMetric(task, stats_left, stats_right), inf)
+            best = np.argmin(calmetric, axis=1)
+            metric = calmetric[np.arange(n_nodes), best]
+            threshold = upper[best].astype(np.float64)
+            # 只有一个非空分箱，只有左子树没有右子树
+            single = np.count_nonzero(nonempty, axis=1) == 1
+            metric[single] = self._impurityFromStats(task, stats_left[single, -1])
+            threshold[single] = upper[np.argmax(nonempty[single], axis=1)]
+            return metric, threshold
+        # exact模式的连续特征：按(节点, 取值)排序一次，每个节点段内的累积量即为左子集的统计量
+        order = np.lexsort((values, node))
+        node = node[order]
+        values = values[order]
+        labels = labels[order]
+        weights = weights[order]
+        if task == 'classification':
+            stats = np.zeros((len(values), len(dataset.classes)))
+            stats[np.arange(len(values)), labels] = weights
+        else:
+            stats = np.stack((weights, weights*labels, weights*labels**2), axis=1)
+        total = self._groupStats(task, dataset, node, n_nodes, labels, weights)
+        cumulative = np.cumsum(stats, axis=0)
+        first = np.flatnonzero(np.r_[True, node[1:] != node[:-1]])
+        before = np.zeros_like(total)
+        before[node[first]] = cumulative[first] - stats[first]
+        cut = np.flatnonzero((node[1:] == node[:-1]) & (values[1:] != values[:-1]))
+        cut_node = node[cut]
+        stats_left = cumulative[cut] - before[cut_node]
+        calmetric = self._splitMetric(task, stats_left, total[cut_node] - stats_left)
+        # 每个节点取指标最小的候选划分点，指标相同时取取值较小的
+        ranked = np.lexsort((cut, calmetric, cut_node))
+        best = ranked[np.r_[True, cut_node[ranked][1:] != cut_node[ranked][:-1]]] if len(ranked) > 0 else ranked
+        metric[cut_node[best]] = calmetric[best]
+        threshold[cut_node[best]] = (values[cut[best]] + values[cut[best] + 1]) / 2
+        # 只有一个取值，只有左子树没有右子树
+        single = np.zeros(n_nodes, dtype=bool)
+        single[node[first]] = True
+        single[cut_node] = False
+        single_first = np.full(n_nodes, -1)
+        single_first[node[first]] = first
+        metric[single] = self._impurityFromStats(task, total[single])
+        threshold[single] = values[single_first[single]]
+        return metric, threshold
+
+    def buildTreeLevelwise(self, task: str, dataset: ColumnData, features: list)-> Node:
+        """
+        逐层（广度优先）构建CART树，不使用递归
+        同一层的所有待划分节点一起处理：每个特征对所有节点的统计量一次算出，所有节点的划分一次完成；
+        缓冲区中每个样本记录所属节点编号，缺失样本复制进左右两个子节点，权重按左右非缺失样本的权重比例缩放
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            dataset: 列式数据集
+            features: 根节点可用的特征索引
+        return:
+            root: 根节点
+        """
+        n_features = len(dataset.attrs)
+        root = Node()
+        nodes = [root]
+        avail = np.zeros((1, n_features), dtype=bool)
+        avail[0, features] = True
+        rows = self._rows
+        weights = self._weights
+        node = np.zeros(len(rows), dtype=np.intp)
+        depth = 1
+        while nodes:
+            # 跟踪时每一层记为一个节点
+            if self.tracer is not None:
+                self.tracer.enterNode(depth, len(rows))
+            n_nodes = len(nodes)
+            labels = dataset.labels[rows]
+            stats = self._groupStats(task, dataset, node, n_nodes, labels, weights)
+            size = np.bincount(node, minlength=n_nodes)
+            # 叶节点条件：类别完全相同（分类）、样本数量收敛（回归）、所有特征均已使用、达到最大深度、所有样本相同
+            if task == 'classification':
+                n_classes = len(dataset.classes)
+                kinds = np.bincount(node * n_classes + labels, minlength=n_nodes * n_classes).reshape(n_nodes, n_classes)
+                leaf = np.count_nonzero(kinds, axis=1) <= 1
+            else:
+                leaf = size <= self.min_samples_split
+            leaf |= ~np.any(avail, axis=1)
+            if self.max_depth is not None and depth > self.max_depth:
+                leaf[:] = True
+            if not np.all(leaf):
+                leaf |= self.levelSame(dataset, node, rows, n_nodes, avail & ~leaf[:, None])
+
+            # 选择最优划分属性：每个特征对所有待划分节点一次查找
+            candidates = avail & ~leaf[:, None]
+            if self._n_candidates is not None:
+                for k in np.flatnonzero(~leaf):
+                    sampled = self.sampleFeatures(list(np.flatnonzero(avail[k])))
+                    candidates[k] = False
+                    candidates[k, sampled] = True
+            metric = np.full((n_nodes, n_features), inf)
+            threshold = np.full((n_nodes, n_features), np.nan)
+            left_masks = {}
+            for j in np.flatnonzero(np.any(candidates, axis=0)):
+                in_node = candidates[node, j]
+                metric[:, j], result = self.levelSplit(task, dataset, j, node[in_node], rows[in_node], weights[in_node], n_nodes)
+                if dataset.attrs_type[j] == 0:
+                    left_masks[j] = result
+                else:
+                    threshold[:, j] = result
+            metric[~candidates] = inf
+            best_feature = np.argmin(metric, axis=1)
+            best_threshold = threshold[np.arange(n_nodes), best_feature]
+            split = ~leaf & np.isfinite(metric[np.arange(n_nodes), best_feature])
+
+            # 所有节点一起划分：左子树样本、缺失样本、右子树样本
+            in_split = split[node]
+            go_left = np.zeros(len(rows), dtype=bool)
+            missing = np.zeros(len(rows), dtype=bool)
+            for j in np.unique(best_feature[split]):
+                in_j = in_split & (best_feature[node] == j)
+                values = dataset.columns[j][rows[in_j]]
+                missing[in_j] = dataset.isMissing(j, values)
+                if dataset.attrs_type[j] == 1:
+                    go_left[in_j] = values <= best_threshold[node[in_j]]
+                else:
+                    go_left[in_j] = (values >= 0) & left_masks[j][node[in_j], np.maximum(values, 0)]
+            go_left &= in_split
+            go_right = in_split & ~go_left & ~missing
+            n_left = np.bincount(node, weights=go_left, minlength=n_nodes)
+            n_right = np.bincount(node, weights=go_right, minlength=n_nodes)
+            n_missing = np.bincount(node, weights=missing, minlength=n_nodes)
+            # 某一侧没有非缺失样本时，缺失样本以原权重进入该侧
+            weight_left = np.bincount(node, weights=weights*go_left, minlength=n_nodes)
+            weight_right = np.bincount(node, weights=weights*go_right, minlength=n_nodes)
+            total_weight = np.where(weight_left + weight_right > 0, weight_left + weight_right, 1.0)
+            scale_left = np.where(n_left > 0, weight_left / total_weight, 1.0)
+            scale_right = np.where(n_right > 0, weight_right / total_weight, 1.0)
+            weights_left = weights * np.where(missing, scale_left[node], 1.0)
+            weights_right = weights * np.where(missing, scale_right[node], 1.0)
+
+            # 预剪枝条件：分裂提升不足
+            in_left = go_left | missing
+            in_right = go_right | missing
+            impurity_left = self._impurityFromStats(task, self._groupStats(task, dataset, node[in_left], n_nodes, labels[in_left], weights_left[in_left]))
+            impurity_right = self._impurityFromStats(task, self._groupStats(task, dataset, node[in_right], n_nodes, labels[in_right], weights_right[in_right]))
+            n = np.where(size > 0, size, 1)
+            with np.errstate(invalid='ignore'):
+                impurity_decrease = (self._impurityFromStats(task, stats) - ((n_left + n_missing) / n) * impurity_left
+                                     - ((n_right + n_missing) / n) * impurity_right)
+                split &= ~(impurity_decrease < self.min_impurity_decrease)
+
+            # 叶节点输出：分类为加权多数类别，回归为加权均值
+            if task == 'classification':
+                leaf_labels = dataset.classes[np.argmax(stats, axis=1)]
+            else:
+                leaf_labels = np.where(stats[:, 0] > 0, stats[:, 1] / np.where(stats[:, 0] > 0, stats[:, 0], 1.0), 0.0).tolist()
+            cover = self._statsWeight(task, stats)
+            next_nodes = []
+            next_avail = []
+            for k in range(n_nodes):
+                current = nodes[k]
+                current.weight = float(cover[k])
+                if not split[k]:
+                    current.label = leaf_labels[k]
+                    current.isleaf = True
+                    continue
+                j = best_feature[k]
+                current.feature = dataset.attrs[j]
+                self.feature_importance[current.feature] += float(cover[k] * impurity_decrease[k])
+                current.left = Node()
+                current.right = Node()
+                avail_left = avail[k].copy()
+                if dataset.attrs_type[j] == 0:
+                    current.classlabel = 'cat'
+                    current.threshold = set(dataset.categories[j][left_masks[j][k]])
+                    # 左子树取值唯一时不再使用该特征
+                    avail_left[j] = np.count_nonzero(left_masks[j][k]) > 1
+                else:
+                    current.classlabel = 'num'
+                    current.threshold = float(best_threshold[k])
+                next_nodes += [current.left, current.right]
+                next_avail += [avail_left, avail[k]]
+
+            # 下一层的缓冲区：第i个划分节点的左右子节点编号为2i和2i+1
+            rank = np.cumsum(split) - 1
+            in_left &= split[node]
+            in_right &= split[node]
+            rows = np.concatenate((rows[in_left], rows[in_right]))
+            weights = np.concatenate((weights_left[in_left], weights_right[in_right]))
+            node = np.concatenate((2 * rank[node[in_left]], 2 * rank[node[in_right]] + 1))
+            nodes = next_nodes
+            avail = np.array(next_avail, dtype=bool).reshape(len(next_nodes), n_features)
+            if self.tracer is not None:
+                self.tracer.exitNode()
+            depth += 1
+        return root
 
     def fit(self, task: str, data: np.ndarray, attrs: list, attrs_type: list)-> Node:
         """
@@ -512,47 +1618,166 @@ class CART:
             data: 训练数据
             attrs: 特征列表
             attrs_type: 特征类型
-        return: 
+        return:
+            self.root: 根节点
+        """
+        # 转换为列式数据集，计数权重单独存放
+        return self.fitDataset(task, ColumnData.fromArray(task, data, attrs, attrs_type))
+
+    def fitDataset(self, task: str, dataset: ColumnData, weights=None)-> Node:
+        """
+        在已构建好的列式数据集上构建CART树，随机森林的多棵树共用同一个数据集
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            dataset: 列式数据集
+            weights: 额外的样本权重（如bootstrap抽样次数），与数据集自带的权重相乘，权重为0的样本不参与训练
+        return:
             self.root: 根节点
         """
-        # 添加计数权重
-        # 添加计数权重到最后一列的左侧
-        label_column = data[:, -1].reshape(-1, 1)  # 提取最后一列（标签列）
-        data_without_label = data[:, :-1]  # 获取除最后一列外的所有数据
-        data = np.concatenate((data_without_label, np.ones((len(data), 1)), label_column), axis=1)
-        # 构建CART树
-        self.root = self.buildTree(task, data, attrs, attrs_type,depth=1)
+        self.task = task
+        self.dataset = dataset
+        if self.tree_method == 'hist' and getattr(dataset, 'bins', None) is None:
+            dataset.buildBins(self.max_bins)
+        self._rng = np.random.default_rng(self.random_state)
+        self._n_candidates = self._resolveMaxFeatures(len(dataset.attrs))
+        self.feature_importance = dict.fromkeys(dataset.attrs, 0.0)
+        # 所有节点共享的行索引缓冲区和权重缓冲区
+        if weights is None:
+            self._rows = np.arange(len(dataset.labels))
+            self._weights = dataset.weights.copy()
+        else:
+            self._rows = np.flatnonzero(weights > 0)
+            self._weights = dataset.weights[self._rows] * weights[self._rows]
+        features = list(range(len(dataset.attrs)))
+        if self.builder == 'levelwise':
+            self.root = self.buildTreeLevelwise(task, dataset, features)
+            return self.root
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        if self.tree_method == 'exact' and n_jobs > 1:
+            self._startPool(task, n_jobs)
+        try:
+            # 构建CART树
+            self.root = self.buildTree(task, dataset, 0, len(self._rows), features, depth=1)
+        finally:
+            self._stopPool()
         return self.root
 
+    def _startPool(self, task: str, n_jobs: int):
+        """
+        把数据集和行索引、权重缓冲区移入共享内存并启动查找划分的进程池
+        param:
+            task: 任务类型
+            n_jobs: 进程数
+        """
+        meta = self.dataset.share()
+        self._buffer_shm = []
+        descs = []
+        for name in ('_rows', '_weights'):
+            shm, array, desc = create_shared_array(getattr(self, name).shape, getattr(self, name).dtype)
+            array[...] = getattr(self, name)
+            setattr(self, name, array)
+            self._buffer_shm.append(shm)
+            descs.append(desc)
+        self._n_workers = n_jobs
+        self._pool = multiprocessing.Pool(n_jobs, initializer=_initSplitWorker,
+                                          initargs=(meta, descs[0], descs[1], self._splitSettings()))
+
+    def _splitSettings(self)-> dict:
+        """
+        查找划分用到的参数，子进程用它构建CART，保证并行与串行建出的树相同
+        return:
+            settings: CART的构造参数
+        """
+        return {'tree_method': self.tree_method, 'max_bins': self.max_bins, 'criterion': self.criterion,
+                'cat_split': self.cat_split}
+
+    def _stopPool(self):
+        """
+        关闭进程池，数据复制回普通内存后释放共享内存
+        """
+        if self._pool is None:
+            return
+        self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+        self._n_workers = 1
+        self._rows = self._rows.copy()
+        self._weights = self._weights.copy()
+        for shm in self._buffer_shm:
+            shm.close()
+            shm.unlink()
+        self._buffer_shm = []
+        self.dataset.unshare()
+
+
+    def compile(self, attribute: list)-> FlatTree:
+        """
+        将训练好的树编译为扁平数组，特征位置只解析一次
+        param:
+            attribute: 特征列表
+        return:
+            flat_tree: 扁平数组形式的树
+        """
+        self.flat_tree = FlatTree.fromNode(self.root, list(attribute), self.task)
+        self._compiled = (self.root, list(attribute))
+        return self.flat_tree
+
+    def save(self, path: str, attribute: list):
+        """
+        编译并保存为二进制模型文件，用ModelIO.load_model加载
+        param:
+            path: 文件路径
+            attribute: 特征列表
+        """
+        save_model(path, self.compile(attribute))
 
     def predict(self, data: np.ndarray, attribute: list, )-> np.ndarray:
         """
-        预测
+        预测，使用编译后的扁平数组树对整批样本逐层向量化地下推
         param:
             data: 测试数据
             attribute: 特征列表
         return:
-            y_pred: 预测值
+            y_pred: 预测值，分类为类别数组，回归为float64数组
         """
         if len(data.shape) == 1:
             data = np.array([data])
-        y_pred = np.empty(len(data), dtype=object)
-        for i in range(len(data)):
-            node = self.root
-            while not node.isleaf:
-                if node.classlabel == 'cat':
-                    if data[i][attribute.index(node.feature)] == node.threshold:
-                        node = node.left
-                    else:
-                        node = node.right
-                elif node.classlabel == 'num':
-                    if data[i][attribute.index(node.feature)] <= node.threshold:
-                        node = node.left
-                    else:
-                        node = node.right
-            y_pred[i] = node.label
-        return y_pred
-        
+        # 树或特征顺序变化时重新编译
+        if self.flat_tree is None or self._compiled[0] is not self.root or self._compiled[1] != list(attribute):
+            self.compile(attribute)
+        return self.flat_tree.predict(data)
+
+    def featureImportance(self, normalize=True)-> dict:
+        """
+        基于增益的特征重要性：每个特征在所有分裂节点上的加权不纯度下降之和，建树时顺带累计
+        param:
+            normalize: 是否归一化为和为1
+        return:
+            importance: 特征 -> 重要性
+        """
+        total = sum(self.feature_importance.values())
+        if not normalize or total <= 0:
+            return dict(self.feature_importance)
+        return {attr: value / total for attr, value in self.feature_importance.items()}
+
+    def shapValues(self, data: np.ndarray, attribute: list)-> tuple[np.ndarray, np.ndarray]:
+        """
+        用TreeSHAP计算每个样本的特征贡献（Shapley值），整批样本向量化计算
+        param:
+            data: 测试数据
+            attribute: 特征列表
+        return:
+            phi: 回归为(样本数, 特征数)，分类为(样本数, 特征数, 类别数)，类别顺序与训练集的类别表一致
+            expected_value: 基准值，expected_value + phi按特征求和 等于predict的输出（分类为预测类别的指示）
+        """
+        # TreeSHAP依赖CART中的Node和ColumnData，在这里导入避免循环导入
+        try:
+            from .TreeSHAP import tree_shap
+        except ImportError:
+            from TreeSHAP import tree_shap
+        classes = list(self.dataset.classes) if self.task == 'classification' and self.dataset is not None else None
+        return tree_shap(self.root, data, attribute, self.task, classes)
+
 
 if __name__ == '__main__':
     import os
@@ -571,6 +1796,33 @@ if __name__ == '__main__':
     y_pred = cart.predict(data[:,:-1], attributes)
     accuracy = sum(y_pred == y_true) / len(data)
     print(f"classification accuracy: {accuracy}")
+    # hist模式与exact模式对比：同一份回归数据上的训练耗时和训练集MSE
+    import time
+    rng = np.random.default_rng(0)
+    X_cmp = rng.normal(size=(50000, 8))
+    y_cmp = 2*X_cmp[:, 0] + np.sin(3*X_cmp[:, 1]) + X_cmp[:, 2]*X_cmp[:, 3] + 0.1*rng.normal(size=len(X_cmp))
+    cmp_attributes = [f"x{i}" for i in range(X_cmp.shape[1])]
+    cmp_data = np.column_stack((X_cmp, y_cmp)).astype(object)
+    for tree_method in ['exact', 'hist']:
+        cmp_cart = CART(min_samples_split=50, max_depth=8, min_impurity_decrease=1e-3, tree_method=tree_method)
+        start_time = time.time()
+        cmp_cart.fit('regression', cmp_data, cmp_attributes, [1]*len(cmp_attributes))
+        fit_time = time.time() - start_time
+        cmp_mse = np.mean((cmp_cart.predict(X_cmp, cmp_attributes) - y_cmp)**2)
+        print(f"{tree_method}: fit {fit_time:.2f}s, train MSE {cmp_mse:.4f}, leaves {cmp_cart.root.get_width()}")
+    # 并行查找划分与串行建出的树相同（离散特征按onehot划分）
+    cat_cmp = rng.choice(list('abcdefg'), size=(20000, 2))
+    y_par = X_cmp[:20000, 0] + 1.5*(cat_cmp[:, 0] == 'b') - (cat_cmp[:, 1] == 'e') + 0.3*rng.normal(size=20000)
+    par_data = np.column_stack((X_cmp[:20000, :3], cat_cmp, y_par)).astype(object)
+    par_attributes = ['x0', 'x1', 'x2', 'c0', 'c1']
+    par_trees = []
+    for n_jobs in [1, 2]:
+        par_cart = CART(min_samples_split=50, max_depth=6, min_impurity_decrease=1e-4, n_jobs=n_jobs,
+                        parallel_min_samples=2000, criterion='weighted', cat_split='onehot')
+        par_cart.fit('regression', par_data, par_attributes, [1, 1, 1, 0, 0])
+        par_trees.append(list(iter_dot(par_cart.root)))
+    assert par_trees[0] == par_trees[1], "n_jobs=2 built a different tree from n_jobs=1"
+    print(f"n_jobs=1 and n_jobs=2 build the same tree ({len(par_trees[0])} dot lines)")
     # 可视化
     cart.root.visualize()
     # 回归任务测试
@@ -0,0 +1,211 @@
+"""
+梯度提升树实现（基于CART回归树）
+"""
+import numpy as np
+
+try:
+    from .CART import CART, ColumnData, FlatTree
+except ImportError:
+    from CART import CART, ColumnData, FlatTree
+
+
+class SquaredLoss:
+    """
+    平方损失 (y - f)^2 / 2
+    """
+    name = 'rmse'
+
+    def gradHess(self, y: np.ndarray, margin: np.ndarray)-> tuple[np.ndarray, np.ndarray]:
+        return margin - y, np.ones_like(margin)
+
+    def baseScore(self, y: np.ndarray)-> float:
+        return float(np.mean(y))
+
+    def transform(self, margin: np.ndarray)-> np.ndarray:
+        return margin
+
+    def metric(self, y: np.ndarray, margin: np.ndarray)-> float:
+        return float(np.sqrt(np.mean((y - margin)**2)))
+
+
+class LogisticLoss:
+    """
+    二分类对数损失，标签为0/1，margin为对数几率
+    """
+    name = 'logloss'
+
+    def gradHess(self, y: np.ndarray, margin: np.ndarray)-> tuple[np.ndarray, np.ndarray]:
+        p = self.transform(margin)
+        return p - y, p * (1 - p)
+
+    def baseScore(self, y: np.ndarray)-> float:
+        p = np.clip(np.mean(y), 1e-6, 1 - 1e-6)
+        return float(np.log(p / (1 - p)))
+
+    def transform(self, margin: np.ndarray)-> np.ndarray:
+        return 1 / (1 + np.exp(-margin))
+
+    def metric(self, y: np.ndarray, margin: np.ndarray)-> float:
+        # log(1 + e^f) - y*f，避免sigmoid饱和后取对数
+        return float(np.mean(np.logaddexp(0, margin) - y * margin))
+
+
+LOSSES = {'squared': SquaredLoss, 'logistic': LogisticLoss}
+
+
+class GBDT:
+    def __init__(self, loss='squared', n_estimators=100, learning_rate=0.1, max_depth=5, min_samples_split=2,
+                 min_impurity_decrease=0.0, reg_lambda=1.0, subsample=1.0, early_stopping_rounds=None,
+                 tree_method='exact', max_bins=255, n_jobs=1, random_state=None):
+        """
+        初始化梯度提升树
+        :param loss: 损失函数，squared为平方损失，logistic为二分类对数损失
+        :param n_estimators: 最大迭代轮数（树的数量）
+        :param learning_rate: 学习率（收缩系数）
+        :param max_depth: 每棵树的最大深度
+        :param min_samples_split: 节点再分裂所需的最小样本数
+        :param min_impurity_decrease: 分裂后最小纯度提升
+        :param reg_lambda: 叶节点输出的L2正则系数，叶节点输出为 -G / (H + reg_lambda)
+        :param subsample: 每轮随机抽取的样本比例（不放回）
+        :param early_stopping_rounds: 验证集指标连续多少轮没有改善时停止，None表示不早停
+        :param tree_method: 划分查找方式，exact或hist
+        :param max_bins: hist模式下连续特征的最大分箱数
+        :param n_jobs: 每棵树查找划分的进程数
+        :param random_state: 随机种子
+        """
+        if loss not in LOSSES:
+            raise ValueError(f"loss must be one of {list(LOSSES)}")
+        self.loss = LOSSES[loss]()
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        self.min_impurity_decrease = min_impurity_decrease
+        self.reg_lambda = reg_lambda
+        self.subsample = subsample
+        self.early_stopping_rounds = early_stopping_rounds
+        self.tree_method = tree_method
+        self.max_bins = max_bins
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.trees = []
+        self.attrs = None
+        self.base_score = 0.0
+        self.best_iteration = None
+        self.evals_result = {}
+
+    def fitTree(self, dataset: ColumnData, grad: np.ndarray, hess: np.ndarray, mask: np.ndarray)-> FlatTree:
+        """
+        用一棵CART回归树拟合一阶、二阶梯度：以 -g/h 为标签、h 为样本权重，
+        加权均方误差最小的划分即为二阶近似下损失下降最多的划分
+        param:
+            dataset: 列式数据集（标签和权重每轮替换）
+            grad: 一阶梯度
+            hess: 二阶梯度
+            mask: 本轮抽中的样本
+        return:
+            tree: 编译后的树（使用数据集的编码表），叶节点输出尚未重新计算
+        """
+        dataset.labels = -grad / np.maximum(hess, 1e-16)
+        cart = CART(min_samples_split=self.min_samples_split, min_impurity_decrease=self.min_impurity_decrease,
+                    max_depth=self.max_depth, tree_method=self.tree_method, max_bins=self.max_bins,
+                    n_jobs=self.n_jobs, criterion='weighted')
+        cart.fitDataset('regression', dataset, hess * mask)
+        return FlatTree.fromNode(cart.root, self.attrs, 'regression', dataset.categories)
+
+    def fit(self, data: np.ndarray, attrs: list, attrs_type: list, eval_set=None)-> list:
+        """
+        训练梯度提升树
+        训练集和验证集的预测值（margin）逐轮缓存，每轮只需计算新树的输出；
+        所有树共用数据集的编码表，训练集和验证集都只在训练开始前编码一次
+        param:
+            data: 训练数据，最后一列为标签（logistic损失为0/1）
+            attrs: 特征列表
+            attrs_type: 特征类型
+            eval_set: 验证数据，格式与data相同，用于早停
+        return:
+            self.trees: 编译后的树
+        """
+        self.attrs = list(attrs)
+        dataset = ColumnData.fromArray('regression', data, attrs, attrs_type)
+        X = dataset.encode()
+        if self.tree_method == 'hist':
+            dataset.buildBins(self.max_bins)
+        y = dataset.labels.copy()
+        n = len(y)
+        rng = np.random.default_rng(self.random_state)
+        self.base_score = self.loss.baseScore(y)
+        self.trees = []
+        self.best_iteration = None
+        self.evals_result = {'train': []}
+        margin = np.full(n, self.base_score)
+        if eval_set is not None:
+            X_valid = dataset.encode(eval_set[:, :-1])
+            y_valid = eval_set[:, -1].astype(np.float64)
+            margin_valid = np.full(len(eval_set), self.base_score)
+            self.evals_result['valid'] = []
+            best_score = np.inf
+
+        for i in range(self.n_estimators):
+            grad, hess = self.loss.gradHess(y, margin)
+            if self.subsample < 1:
+                mask = np.zeros(n)
+                mask[rng.choice(n, max(1, int(self.subsample * n)), replace=False)] = 1.0
+            else:
+                mask = np.ones(n)
+            tree = self.fitTree(dataset, grad, hess, mask)
+            # 按预测时的路由重新计算叶节点输出 -G / (H + lambda)，并乘以学习率
+            leaves = tree.apply(X)
+            G = np.bincount(leaves, weights=grad * mask, minlength=len(tree.value))
+            H = np.bincount(leaves, weights=hess * mask, minlength=len(tree.value))
+            is_leaf = tree.left < 0
+            tree.value = np.where(is_leaf, -self.learning_rate * G / np.maximum(H + self.reg_lambda, 1e-16), 0.0)
+            self.trees.append(tree)
+            margin += tree.value[leaves]
+            self.evals_result['train'].append(self.loss.metric(y, margin))
+
+            if eval_set is not None:
+                margin_valid += tree.value[tree.apply(X_valid)]
+                score = self.loss.metric(y_valid, margin_valid)
+                self.evals_result['valid'].append(score)
+                if score < best_score:
+                    best_score = score
+                    self.best_iteration = i
+                elif self.early_stopping_rounds is not None and i - self.best_iteration >= self.early_stopping_rounds:
+                    break
+        # 早停时只保留验证集上最好的那一轮及之前的树
+        if self.best_iteration is not None and self.early_stopping_rounds is not None:
+            self.trees = self.trees[:self.best_iteration + 1]
+        return self.trees
+
+    def predict(self, data: np.ndarray, attribute: list, output_margin=False)-> np.ndarray:
+        """
+        预测
+        param:
+            data: 测试数据
+            attribute: 特征列表，需与训练时一致
+            output_margin: 是否返回未经变换的margin
+        return:
+            y_pred: 平方损失为预测值，logistic损失为正类概率
+        """
+        if len(data.shape) == 1:
+            data = np.array([data])
+        if list(attribute) != self.attrs:
+            raise ValueError("attribute must match the attributes used in fit")
+        margin = np.full(len(data), self.base_score)
+        for tree in self.trees:
+            margin += tree.predict(data)
+        return margin if output_margin else self.loss.transform(margin)
+
+
+if __name__ == '__main__':
+    # 回归：训练集和验证集上每轮的RMSE
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(5000, 5))
+    y = 2*X[:, 0] + np.sin(3*X[:, 1]) + X[:, 2]*X[:, 3] + 0.1*rng.normal(size=len(X))
+    attributes = [f"x{i}" for i in range(X.shape[1])]
+    data = np.column_stack((X, y)).astype(object)
+    model = GBDT('squared', n_estimators=300, learning_rate=0.1, max_depth=4, subsample=0.8, early_stopping_rounds=20, random_state=0)
+    model.fit(data[:4000], attributes, [1]*len(attributes), eval_set=data[4000:])
+    print(f"trees: {len(model.trees)}, best iteration: {model.best_iteration}, "
+          f"valid RMSE: {model.evals_result['valid'][model.best_iteration]:.4f}")
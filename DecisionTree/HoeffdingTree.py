@@ -0,0 +1,428 @@
+"""
+Hoeffding树（VFDT）：流式数据上增量训练的决策树
+每个叶节点只保存有界的充分统计量（每个特征各分箱的统计量），新数据按批下推到叶节点后累加；
+叶节点累计到一定样本数时，用Hoeffding界判断最优划分是否已经确定，确定后才划分。
+每批的更新代价只与批大小和被访问的叶节点数有关，与历史数据量无关；树由CART的Node构成，可直接可视化和预测
+"""
+import numpy as np
+import pandas as pd
+from math import inf
+
+try:
+    from .CART import CART, ColumnData, Node
+except ImportError:
+    from CART import CART, ColumnData, Node
+
+
+class HoeffdingTree(CART):
+    def __init__(self, grace_period=200, delta=1e-7, tau=0.05, max_depth=15, max_bins=64, min_impurity_decrease=0.0,
+                 cat_split='partition', warmup_samples=1000):
+        """
+        初始化Hoeffding树
+        :param grace_period: 叶节点每新增多少权重的样本尝试一次划分
+        :param delta: Hoeffding界的置信参数，最优划分判断错误的概率不超过delta
+        :param tau: 最优与次优划分难以区分时，Hoeffding界小于tau即认为二者等价而直接划分
+        :param max_depth: 树的最大深度
+        :param max_bins: 连续特征的最大分箱数，分箱边界由前warmup_samples个样本的分位数确定
+        :param min_impurity_decrease: 分裂后最小纯度提升
+        :param cat_split: 离散特征的划分方式，与CART相同
+        :param warmup_samples: 确定分箱边界所需的样本数；到达的样本数不足时先缓存，
+                               每批用全部缓存样本从头重建树，避免很小的第一批数据把分箱数永久限制得很少
+        """
+        super().__init__(min_samples_split=grace_period, min_impurity_decrease=min_impurity_decrease, max_depth=max_depth,
+                         tree_method='hist', max_bins=max_bins, criterion='weighted', cat_split=cat_split)
+        self.grace_period = grace_period
+        self.delta = delta
+        self.tau = tau
+        self.warmup_samples = warmup_samples
+        self._buffer = None
+        self.root = None
+        self.attrs = None
+        self.attrs_type = None
+        self.n_seen = 0
+
+    def _start(self, task: str, data: np.ndarray, attrs: list, attrs_type: list):
+        """
+        由最先到达的数据（缓存的全部样本）确定连续特征的分箱边界，初始化编码表、路由表和根节点
+        """
+        if task not in ('classification', 'regression'):
+            raise ValueError("task must be 'classification' or 'regression'")
+        self.task = task
+        self.attrs = list(attrs)
+        self.attrs_type = list(attrs_type)
+        n_features = len(self.attrs)
+        self.bin_edges = [None] * n_features
+        self.bin_upper = [None] * n_features
+        self.n_bins = [0] * n_features
+        self._tables = {}
+        for j in range(n_features):
+            if self.attrs_type[j] == 1:
+                col = data[:, j]
+                present = col[~ColumnData.missingMask(col)].astype(np.float64)
+                uniqueVals = np.unique(present)
+                if len(uniqueVals) <= self.max_bins:
+                    edges = (uniqueVals[:-1] + uniqueVals[1:]) / 2
+                else:
+                    edges = np.unique(np.quantile(present, np.linspace(0, 1, self.max_bins + 1)[1:-1]))
+                self.bin_edges[j] = edges
+                self.bin_upper[j] = np.append(edges, uniqueVals[-1] if len(uniqueVals) > 0 else inf)
+                self.n_bins[j] = len(edges) + 1
+            else:
+                self._tables[j] = {}
+        self._class_table = {}
+        self.categories = [None] * n_features
+        self.classes = None
+        # 统计量计算（_groupStats）只用到数据集的类别表
+        self.dataset = ColumnData(self.attrs, self.attrs_type, [None] * n_features, self.categories,
+                                  np.empty(0, dtype=np.int64), np.empty(0), self.classes)
+        n_stats = 0 if task == 'classification' else 3
+        # 路由表：节点编号 -> 划分特征、左子节点编号（右子节点为其后一个）、缺失样本进入左右两侧的权重比例、
+        # 在该特征左子树分箱表中的列、叶节点的统计量槽位
+        self._feature, self._left, self._scale, self._split_column, self._slot, self._nodes, self._depth = [], [], [], [], [], [], []
+        self._left_bins = {j: np.zeros((self.n_bins[j], 0), dtype=bool) for j in range(n_features)}
+        # 叶节点槽位 -> 路由表中的节点编号、统计量、自创建以来的样本权重、上次尝试划分时的样本权重
+        # 统计量数组按容量翻倍预分配，前len(self._slot_node)行为在用的槽位
+        self._slot_node = []
+        self._stats = np.zeros((0, n_stats))
+        self._seen = np.zeros(0)
+        self._last_eval = np.zeros(0)
+        self._hist = {j: np.zeros((0, self.n_bins[j], n_stats)) for j in range(n_features)}
+        self._missing = {j: np.zeros((0, n_stats)) for j in range(n_features)}
+        self.feature_importance = dict.fromkeys(self.attrs, 0.0)
+        self.root = Node()
+        self.root.isleaf = True
+        self._addLeaf(self.root, 1, np.zeros(n_stats))
+
+    def _addLeaf(self, node: Node, depth: int, stats: np.ndarray, slot=None)-> int:
+        """
+        在路由表中登记叶节点并分配统计量槽位，slot不为None时复用该槽位
+        return:
+            index: 叶节点在路由表中的编号
+        """
+        index = len(self._feature)
+        self._feature.append(-1)
+        self._left.append(-1)
+        self._scale.append((1.0, 1.0))
+        self._split_column.append(-1)
+        self._nodes.append(node)
+        self._depth.append(depth)
+        if slot is None:
+            slot = len(self._slot_node)
+            self._slot_node.append(index)
+            if slot >= len(self._seen):
+                self._growSlots(max(2 * len(self._seen), 8))
+        else:
+            self._slot_node[slot] = index
+        self._stats[slot] = stats
+        self._seen[slot] = 0.0
+        self._last_eval[slot] = 0.0
+        for j in self._hist:
+            self._hist[j][slot] = 0.0
+            self._missing[j][slot] = 0.0
+        self._slot.append(slot)
+        return index
+
+    def _growSlots(self, capacity: int):
+        """
+        把统计量数组扩容到capacity个槽位（容量翻倍，新增叶节点的均摊开销与叶节点数无关）
+        """
+        def grow(array):
+            grown = np.zeros((capacity,) + array.shape[1:])
+            grown[:len(array)] = array
+            return grown
+        self._stats = grow(self._stats)
+        self._seen = grow(self._seen)
+        self._last_eval = grow(self._last_eval)
+        for j in self._hist:
+            self._hist[j] = grow(self._hist[j])
+            self._missing[j] = grow(self._missing[j])
+
+    @staticmethod
+    def _encodeValues(table: dict, values: np.ndarray)-> np.ndarray:
+        """
+        按编码表编码一列取值，新出现的取值追加到编码表末尾，缺失值为-1
+        """
+        codes = pd.Index(list(table), dtype=object).get_indexer(values)
+        unseen = (codes < 0) & ~pd.isna(values)
+        if np.any(unseen):
+            for value in pd.unique(values[unseen]):
+                table.setdefault(value, len(table))
+            codes = pd.Index(list(table), dtype=object).get_indexer(values)
+        return codes
+
+    def _encode(self, data: np.ndarray)-> tuple[list, np.ndarray]:
+        """
+        把一批原始数据编码为每个特征的分箱编号（缺失值为-1）和标签编码
+        离散特征或类别出现新取值时，扩充各叶节点统计量的对应维度
+        """
+        bins = [None] * len(self.attrs)
+        for j in range(len(self.attrs)):
+            col = data[:, j]
+            missing = ColumnData.missingMask(col)
+            if self.attrs_type[j] == 1:
+                values = np.where(missing, 0.0, col).astype(np.float64)
+                bins[j] = np.where(missing, -1, np.searchsorted(self.bin_edges[j], values, side='left'))
+            else:
+                bins[j] = self._encodeValues(self._tables[j], np.where(missing, None, col))
+                if len(self._tables[j]) > self.n_bins[j]:
+                    grow = len(self._tables[j]) - self.n_bins[j]
+                    self._hist[j] = np.pad(self._hist[j], ((0, 0), (0, grow), (0, 0)))
+                    self._left_bins[j] = np.pad(self._left_bins[j], ((0, grow), (0, 0)))
+                    self.n_bins[j] = len(self._tables[j])
+                    self.categories[j] = np.array(list(self._tables[j]), dtype=object)
+        if self.task == 'classification':
+            labels = self._encodeValues(self._class_table, data[:, -1]).astype(np.int64)
+            grow = len(self._class_table) - self._stats.shape[1]
+            if grow > 0:
+                self._stats = np.pad(self._stats, ((0, 0), (0, grow)))
+                for j in self._hist:
+                    self._hist[j] = np.pad(self._hist[j], ((0, 0), (0, 0), (0, grow)))
+                    self._missing[j] = np.pad(self._missing[j], ((0, 0), (0, grow)))
+                self.classes = np.array(list(self._class_table), dtype=object)
+                self.dataset.classes = self.classes
+        else:
+            labels = data[:, -1].astype(np.float64)
+        return bins, labels
+
+    def _route(self, bins: list, n: int)-> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        把一批样本沿树下推到叶节点，缺失样本复制进左右两个子节点，权重按划分时的比例缩放
+        return:
+            rows: 样本在批中的行号（缺失样本可能出现多次）
+            node: 样本所在的叶节点编号
+            weights: 样本的权重
+        """
+        feature = np.asarray(self._feature)
+        left = np.asarray(self._left)
+        scale = np.asarray(self._scale).reshape(-1, 2)
+        split_column = np.asarray(self._split_column)
+        rows = np.arange(n)
+        node = np.zeros(n, dtype=np.intp)
+        weights = np.ones(n)
+        while True:
+            internal = feature[node] >= 0
+            if not np.any(internal):
+                return rows, node, weights
+            go_left = np.zeros(len(rows), dtype=bool)
+            missing = np.zeros(len(rows), dtype=bool)
+            for j in np.unique(feature[node[internal]]):
+                in_j = internal & (feature[node] == j)
+                b = bins[j][rows[in_j]]
+                missing[in_j] = b < 0
+                go_left[in_j] = self._left_bins[j][np.maximum(b, 0), split_column[node[in_j]]]
+            go_left &= internal & ~missing
+            go_right = internal & ~go_left & ~missing
+            stay = ~internal
+            rows = np.concatenate((rows[stay], rows[go_left], rows[go_right], rows[missing], rows[missing]))
+            weights = np.concatenate((weights[stay], weights[go_left], weights[go_right],
+                                      weights[missing] * scale[node[missing], 0], weights[missing] * scale[node[missing], 1]))
+            node = np.concatenate((node[stay], left[node[go_left]], left[node[go_right]] + 1,
+                                   left[node[missing]], left[node[missing]] + 1))
+
+    def _leafLabel(self, stats: np.ndarray):
+        """
+        由叶节点统计量计算输出
+        """
+        if self.task == 'classification':
+            return self.classes[np.argmax(stats)] if np.sum(stats) > 0 else None
+        return float(stats[1] / stats[0]) if stats[0] > 0 else 0.0
+
+    def _splitGains(self, slots: np.ndarray)-> tuple[np.ndarray, dict]:
+        """
+        若干叶节点在所有特征上的最优划分的纯度提升
+        缺失样本不参与划分，提升按非缺失样本的权重比例折算
+        param:
+            slots: 叶节点的统计量槽位
+        return:
+            gain: (叶节点数, 特征数)，没有可用划分时为-inf
+            left_bins: 特征索引 -> (叶节点数, 分箱数)，走向左子树的分箱
+        """
+        task = self.task
+        gain = np.full((len(slots), len(self.attrs)), -inf)
+        left_bins = {}
+        for j in range(len(self.attrs)):
+            stats = self._hist[j][slots]
+            present = np.sum(stats, axis=1)
+            weight_present = self._statsWeight(task, present)
+            weight_all = weight_present + self._statsWeight(task, self._missing[j][slots])
+            if self.attrs_type[j] == 0:
+                metric, left_bins[j] = self.categoricalPartition(task, stats)
+            else:
+                nonempty = self._statsWeight(task, stats) > 0
+                stats_left = np.cumsum(stats, axis=1)
+                stats_right = stats_left[:, -1:] - stats_left
+                n_after = np.cumsum(nonempty[:, ::-1], axis=1)[:, ::-1]
+                calmetric = np.where(nonempty & (n_after > 1), self._splitMetric(task, stats_left, stats_right), inf)
+                best = np.argmin(calmetric, axis=1)
+                metric = calmetric[np.arange(len(slots)), best]
+                left_bins[j] = np.arange(stats.shape[1])[None, :] <= best[:, None]
+            with np.errstate(invalid='ignore'):
+                gain[:, j] = np.where(np.isfinite(metric) & (weight_all > 0),
+                                      weight_present / np.where(weight_all > 0, weight_all, 1.0)
+                                      * (self._impurityFromStats(task, present) - metric), -inf)
+        return gain, left_bins
+
+    def _trySplit(self, slots: np.ndarray):
+        """
+        对样本数足够的叶节点计算最优和次优划分，Hoeffding界判断最优划分已确定时划分
+        分类以基尼指数的下降为指标（取值范围R=1），要求 G1 - G2 > eps；
+        回归以均方误差的下降为指标，比较次优与最优的比值，要求 G2 / G1 < 1 - eps；
+        eps = sqrt(R^2 ln(1/delta) / (2n))，eps < tau 时认为两者等价，直接划分
+        param:
+            slots: 待检查的叶节点槽位
+        """
+        gain, left_bins = self._splitGains(slots)
+        self._last_eval[slots] = self._seen[slots]
+        order = np.argsort(-gain, axis=1)
+        best_feature = order[:, 0]
+        best = gain[np.arange(len(slots)), best_feature]
+        second = np.maximum(gain[np.arange(len(slots)), order[:, 1]], 0.0) if len(self.attrs) > 1 else np.zeros(len(slots))
+        eps = np.sqrt(np.log(1 / self.delta) / (2 * self._seen[slots]))
+        if self.task == 'classification':
+            settled = best - second > eps
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                settled = second / best < 1 - eps
+        split = np.isfinite(best) & (best > 0) & ~(best < self.min_impurity_decrease) & (settled | (eps < self.tau))
+        for k in np.flatnonzero(split):
+            # 划分时的纯度提升按判断所用的样本权重计入特征重要性
+            self.feature_importance[self.attrs[best_feature[k]]] += float(self._seen[slots[k]] * best[k])
+            self._splitLeaf(slots[k], best_feature[k], left_bins[best_feature[k]][k])
+
+    def _splitLeaf(self, slot: int, index: int, mask: np.ndarray):
+        """
+        划分叶节点：左子节点复用原槽位，右子节点分配新槽位；
+        子节点的统计量由划分时的直方图得到（用于输出），直方图从零开始累加
+        param:
+            slot: 叶节点的统计量槽位
+            index: 划分特征索引
+            mask: 走向左子树的分箱
+        """
+        task = self.task
+        parent = self._slot_node[slot]
+        stats = self._hist[index][slot]
+        stats_left = np.sum(stats[mask], axis=0)
+        stats_right = np.sum(stats[~mask], axis=0)
+        weight_left = self._statsWeight(task, stats_left)
+        scale_left = weight_left / (weight_left + self._statsWeight(task, stats_right))
+        # 缺失样本按左右非缺失样本的权重比例进入两侧
+        stats_left = stats_left + scale_left * self._missing[index][slot]
+        stats_right = stats_right + (1 - scale_left) * self._missing[index][slot]
+        node = self._nodes[parent]
+        node.feature = self.attrs[index]
+        if self.attrs_type[index] == 0:
+            node.classlabel = 'cat'
+            node.threshold = set(self.categories[index][mask])
+        else:
+            node.classlabel = 'num'
+            node.threshold = float(self.bin_upper[index][np.count_nonzero(mask) - 1])
+        node.isleaf = False
+        node.label = None
+        node.left = Node()
+        node.right = Node()
+        depth = self._depth[parent] + 1
+        for child, child_stats in ((node.left, stats_left), (node.right, stats_right)):
+            child.isleaf = True
+            child.label = self._leafLabel(child_stats)
+            child.weight = float(self._statsWeight(task, child_stats))
+        self._feature[parent] = index
+        self._scale[parent] = (scale_left, 1 - scale_left)
+        self._split_column[parent] = self._left_bins[index].shape[1]
+        self._left_bins[index] = np.column_stack((self._left_bins[index], mask))
+        self._slot[parent] = -1
+        self._left[parent] = self._addLeaf(node.left, depth, stats_left, slot)
+        self._addLeaf(node.right, depth, stats_right)
+
+    def partial_fit(self, task: str, data: np.ndarray, attrs: list, attrs_type: list)-> Node:
+        """
+        用一批数据增量训练
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)，每批必须相同
+            data: 一批训练数据，最后一列为标签
+            attrs: 特征列表，每批必须相同
+            attrs_type: 特征类型
+        return:
+            self.root: 根节点
+        """
+        if len(data) == 0:
+            return self.root
+        if self.root is not None and (task != self.task or list(attrs) != self.attrs):
+            raise ValueError("task and attrs must match the first batch")
+        if self.root is None or self._buffer is not None:
+            # 分箱边界确定之前：缓存样本，用全部缓存样本重新确定分箱边界并从头训练（缓存的样本数有上限）
+            buffer = (self._buffer or []) + [data]
+            data = np.concatenate(buffer)
+            self._start(task, data, attrs, attrs_type)
+            self.n_seen = 0
+            warming = len(data) < self.warmup_samples and 1 in self.attrs_type
+            self._buffer = buffer if warming else None
+        bins, labels = self._encode(data)
+        rows, node, weights = self._route(bins, len(data))
+        self.n_seen += len(data)
+
+        # 只更新本批访问到的叶节点：槽位映射为本批内的局部编号后累加
+        slots, local = np.unique(np.asarray(self._slot)[node], return_inverse=True)
+        n_local = len(slots)
+        labels = labels[rows]
+        stats = self._groupStats(self.task, self.dataset, local, n_local, labels, weights)
+        self._stats[slots] += stats
+        self._seen[slots] += self._statsWeight(self.task, stats)
+        for j in range(len(self.attrs)):
+            b = bins[j][rows]
+            missing = b < 0
+            n_groups = self.n_bins[j]
+            hist = self._groupStats(self.task, self.dataset, local[~missing] * n_groups + b[~missing], n_local * n_groups,
+                                    labels[~missing], weights[~missing])
+            self._hist[j][slots] += hist.reshape(n_local, n_groups, -1)
+            self._missing[j][slots] += self._groupStats(self.task, self.dataset, local[missing], n_local, labels[missing], weights[missing])
+        for slot in slots:
+            leaf = self._nodes[self._slot_node[slot]]
+            leaf.label = self._leafLabel(self._stats[slot])
+            leaf.weight = float(self._statsWeight(self.task, self._stats[slot]))
+
+        # 自上次尝试以来新增样本达到grace_period、且未达到最大深度的叶节点尝试划分
+        ready = self._seen[slots] - self._last_eval[slots] >= self.grace_period
+        if self.max_depth is not None:
+            ready &= np.asarray(self._depth)[np.asarray(self._slot_node)[slots]] <= self.max_depth
+        if np.any(ready):
+            self._trySplit(slots[ready])
+        # 树已变化，预测时重新编译
+        self.flat_tree = None
+        return self.root
+
+    def fit(self, task: str, data: np.ndarray, attrs: list, attrs_type: list, batch_size=1000)-> Node:
+        """
+        从头训练：按batch_size依次调用partial_fit
+        """
+        self.root = None
+        self._buffer = None
+        self.n_seen = 0
+        for start in range(0, len(data), batch_size):
+            self.partial_fit(task, data[start:start + batch_size], attrs, attrs_type)
+        return self.root
+
+
+if __name__ == '__main__':
+    import time
+    # 模拟点击流：数据分批到达，每批增量更新后在留出集上评估准确率
+    rng = np.random.default_rng(0)
+    n = 200000
+    X = rng.normal(size=(n, 5))
+    device = rng.choice(np.array(['pc', 'phone', 'tablet']), n)
+    y = np.where(X[:, 0] + X[:, 1]*X[:, 2] + (device == 'phone') + 0.5*rng.normal(size=n) > 0.5, 'click', 'skip')
+    attributes = [f"x{i}" for i in range(X.shape[1])] + ['device']
+    attributeProps = [1]*X.shape[1] + [0]
+    data = np.column_stack((X, device, y)).astype(object)
+    train, test = data[:180000], data[180000:]
+    tree = HoeffdingTree(grace_period=200, max_depth=10)
+    start_time = time.time()
+    for i, start in enumerate(range(0, len(train), 10000)):
+        tree.partial_fit('classification', train[start:start + 10000], attributes, attributeProps)
+        if i % 3 == 2:
+            accuracy = np.mean(tree.predict(test[:, :-1], attributes) == test[:, -1])
+            print(f"seen {tree.n_seen}: leaves {tree.root.get_width()}, test accuracy {accuracy:.4f}")
+    print(f"streaming fit {time.time() - start_time:.2f}s")
+    cart = CART(min_samples_split=20, min_impurity_decrease=0.0, max_depth=10, tree_method='hist', criterion='weighted')
+    start_time = time.time()
+    cart.fit('classification', train, attributes, attributeProps)
+    print(f"batch CART: fit {time.time() - start_time:.2f}s, test accuracy {np.mean(cart.predict(test[:, :-1], attributes) == test[:, -1]):.4f}")
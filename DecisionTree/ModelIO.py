@@ -0,0 +1,140 @@
+"""
+决策树模型的二进制存储格式
+文件结构：魔数(8字节) | 格式版本(uint32) | 头部长度(uint32) | JSON头部 | 按64字节对齐的连续数组
+JSON头部记录模型类型、元数据（特征列表、离散特征的取值表、类别表等）以及每个数组的dtype、shape和偏移，
+节点数组按原样写入，加载时直接以只读方式memmap，多个服务进程共享同一份页缓存而不复制模型
+"""
+import importlib.machinery
+import importlib.util
+import json
+import os
+import struct
+import sys
+import numpy as np
+
+MAGIC = b'DTMODEL\x00'
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+# 模型类型 -> 模型类，模型类需实现toArrays()和classmethod fromArrays(meta, arrays)
+_MODEL_TYPES = {}
+# 尚未注册时按需加载的源文件，C45.PY的扩展名是大写的，不能直接import
+_MODEL_SOURCES = {'cart': 'CART.py', 'c45': 'C45.PY'}
+
+
+def register_model(kind: str, cls):
+    """
+    注册模型类型
+    :param kind: 写入文件头部的模型类型名
+    :param cls: 模型类
+    """
+    _MODEL_TYPES[kind] = cls
+
+
+def to_json_value(value):
+    """
+    将numpy标量、数组及其嵌套结构转换为可写入JSON的Python对象
+    :param value: 任意值
+    :return: JSON可序列化的值
+    """
+    if isinstance(value, np.ndarray):
+        return [to_json_value(v) for v in value.tolist()]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): to_json_value(v) for k, v in value.items()}
+    return value
+
+
+def _align(n: int)-> int:
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_model(path: str, model):
+    """
+    将扁平数组形式的树写入模型文件
+    :param path: 文件路径
+    :param model: 实现了toArrays()的模型（如CART的FlatTree、C45的FlatC45）
+    """
+    kind, meta, arrays = model.toArrays()
+    layout = {}
+    offset = 0
+    contiguous = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        # 统一以小端序存储
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        contiguous[name] = array
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({'kind': kind, 'meta': to_json_value(meta), 'arrays': layout}, ensure_ascii=False).encode('utf-8')
+    data_start = _align(len(MAGIC) + 8 + len(header))
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II', FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, array in contiguous.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+
+def read_header(path: str)-> tuple[dict, int]:
+    """
+    读取并校验模型文件头部
+    :param path: 文件路径
+    :return: 头部，数组区的起始位置
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a decision tree model file")
+        version, header_len = struct.unpack('<II', f.read(8))
+        if version != FORMAT_VERSION:
+            raise ValueError(f"model format version {version} is not supported (expected {FORMAT_VERSION}), re-save the model")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    return header, _align(len(MAGIC) + 8 + header_len)
+
+
+def _modelType(kind: str):
+    """
+    按模型类型取得模型类，尚未注册时加载对应的源文件
+    :param kind: 模型类型名
+    :return: 模型类
+    """
+    if kind not in _MODEL_TYPES:
+        if kind not in _MODEL_SOURCES:
+            raise ValueError(f"unknown model kind {kind!r}")
+        source = os.path.join(os.path.dirname(os.path.abspath(__file__)), _MODEL_SOURCES[kind])
+        name = os.path.splitext(_MODEL_SOURCES[kind])[0]
+        # 作为包的一部分导入时，模型模块也放在包内，使其中的相对导入注册到同一个ModelIO
+        if __package__:
+            name = f"{__package__}.{name}"
+        loader = importlib.machinery.SourceFileLoader(name, source)
+        spec = importlib.util.spec_from_loader(name, loader)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+    return _MODEL_TYPES[kind]
+
+
+def load_model(path: str, mmap=True):
+    """
+    加载模型文件
+    :param path: 文件路径
+    :param mmap: 是否以只读方式memmap数组，为False时读入内存
+    :return: 扁平数组形式的树，可直接predict
+    """
+    header, data_start = read_header(path)
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    else:
+        buffer = np.fromfile(path, dtype=np.uint8)
+    arrays = {}
+    for name, desc in header['arrays'].items():
+        dtype = np.dtype(desc['dtype'])
+        start = data_start + desc['offset']
+        count = int(np.prod(desc['shape']))
+        arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(desc['shape'])
+    return _modelType(header['kind']).fromArrays(header['meta'], arrays)
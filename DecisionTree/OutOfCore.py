@@ -0,0 +1,659 @@
+"""
+CART的外存（out-of-core）训练
+数据按块读取（CSV分块或memmap列存储），内存中只保留一块数据、每个特征的分箱边界、当前层的直方图和树本身：
+先扫描一遍数据，用流式分位数摘要求出分箱边界；之后每一层扫描一遍数据，
+把每块样本沿已建好的树下推到当前层的节点，逐块累加(节点, 特征, 分箱)的统计量，再一次完成整层的划分
+"""
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from math import inf
+
+try:
+    from .CART import CART, ColumnData, Node
+    from .ModelIO import to_json_value
+except ImportError:
+    from CART import CART, ColumnData, Node
+    from ModelIO import to_json_value
+
+
+class QuantileSketch:
+    def __init__(self, capacity=8192, max_exact=255):
+        """
+        流式分位数摘要：保存按取值排序的(取值, 计数)，超过容量时把秩相邻的点合并，内存与数据量无关
+        取值个数不超过max_exact时同时保存全部取值，分箱与内存中的hist模式一致（每个取值单独一箱）
+        :param capacity: 摘要保存的最大点数
+        :param max_exact: 精确保存全部取值的最大取值个数
+        """
+        self.capacity = capacity
+        self.max_exact = max_exact
+        self.values = np.empty(0)
+        self.counts = np.empty(0)
+        self.uniques = np.empty(0)
+        self.max = -inf
+
+    def update(self, values: np.ndarray):
+        """
+        加入一块取值，缺失值(nan)忽略
+        param:
+            values: 一块连续特征的取值
+        """
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.max = max(self.max, float(np.max(values)))
+        values, counts = np.unique(values, return_counts=True)
+        if self.uniques is not None:
+            self.uniques = np.union1d(self.uniques, values)
+            if len(self.uniques) > self.max_exact:
+                self.uniques = None
+        values = np.concatenate((self.values, values))
+        counts = np.concatenate((self.counts, counts))
+        order = np.argsort(values, kind='stable')
+        self.values = values[order]
+        self.counts = counts[order]
+        if len(self.values) > self.capacity:
+            self.compress()
+
+    def compress(self):
+        """
+        按累积计数把摘要均分为capacity段，每段合并为一个点（取值取段内最大值，计数求和）
+        """
+        cumulative = np.cumsum(self.counts)
+        segment = np.floor((cumulative - self.counts) / cumulative[-1] * self.capacity).astype(np.intp)
+        last = np.flatnonzero(np.r_[segment[1:] != segment[:-1], True])
+        self.values = self.values[last]
+        self.counts = np.add.reduceat(self.counts, np.r_[0, last[:-1] + 1])
+
+    def quantile(self, q: np.ndarray)-> np.ndarray:
+        """
+        近似分位数
+        param:
+            q: 分位点
+        return:
+            values: 分位点对应的取值
+        """
+        cumulative = np.cumsum(self.counts)
+        index = np.searchsorted(cumulative, np.asarray(q) * cumulative[-1], side='left')
+        return self.values[np.minimum(index, len(self.values) - 1)]
+
+    def edges(self, max_bins=255)-> tuple[np.ndarray, np.ndarray]:
+        """
+        分箱边界，规则与ColumnData.buildBins相同
+        param:
+            max_bins: 最大分箱数
+        return:
+            edges: 分箱边界，x <= edges[b] 落入第b箱
+            upper: 各分箱的上界，最后一箱的上界为最大值
+        """
+        if len(self.values) == 0:
+            return np.empty(0), np.array([inf])
+        if self.uniques is not None and len(self.uniques) <= max_bins:
+            edges = (self.uniques[:-1] + self.uniques[1:]) / 2
+        else:
+            edges = np.unique(self.quantile(np.linspace(0, 1, max_bins + 1)[1:-1]))
+            edges = edges[edges < self.max]
+        return edges, np.append(edges, self.max)
+
+
+class CSVChunks:
+    def __init__(self, path: str, task: str, attrs: list, attrs_type: list, label=None, chunksize=100000, **read_csv_kwargs):
+        """
+        按块读取CSV文件，每块编码为列式数据集
+        离散特征和类别的编码表在读取过程中增长，已出现的取值编码不变，扫描一遍后编码表完整
+        :param path: CSV文件路径
+        :param task: 任务类型，分类(classfication)或回归(regression)
+        :param attrs: 特征列表（CSV中的列名）
+        :param attrs_type: 特征类型，1为连续特征，0为离散特征
+        :param label: 标签列名，默认为最后一列
+        :param chunksize: 每块的行数
+        :param read_csv_kwargs: 传给pd.read_csv的其他参数（如encoding）
+        """
+        if task not in ('classification', 'regression'):
+            raise ValueError("task must be 'classification' or 'regression'")
+        self.path = path
+        self.task = task
+        self.attrs = list(attrs)
+        self.attrs_type = list(attrs_type)
+        self.label = label
+        self.chunksize = chunksize
+        self.read_csv_kwargs = read_csv_kwargs
+        self._tables = {j: {} for j in range(len(self.attrs)) if self.attrs_type[j] == 0}
+        self._class_table = {}
+
+    @property
+    def categories(self)-> list:
+        return [np.array(list(self._tables[j]), dtype=object) if j in self._tables else None for j in range(len(self.attrs))]
+
+    @property
+    def classes(self):
+        return np.array(list(self._class_table), dtype=object) if self.task == 'classification' else None
+
+    @staticmethod
+    def _encode(table: dict, values: np.ndarray)-> np.ndarray:
+        """
+        按编码表编码一列取值，新出现的取值追加到编码表末尾
+        param:
+            table: 取值 -> 编码
+            values: 取值，缺失值为None
+        return:
+            codes: int64编码，缺失值为-1
+        """
+        codes = pd.Index(list(table), dtype=object).get_indexer(values)
+        unseen = (codes < 0) & ~pd.isna(values)
+        if np.any(unseen):
+            for value in pd.unique(values[unseen]):
+                table.setdefault(value, len(table))
+            codes = pd.Index(list(table), dtype=object).get_indexer(values)
+        return codes
+
+    def __iter__(self):
+        label = self.label
+        for frame in pd.read_csv(self.path, chunksize=self.chunksize, **self.read_csv_kwargs):
+            if label is None:
+                label = frame.columns[-1]
+            data = frame[self.attrs + [label]].to_numpy(dtype=object)
+            n = len(data)
+            columns = [None] * len(self.attrs)
+            for j in range(len(self.attrs)):
+                missing = ColumnData.missingMask(data[:, j])
+                if self.attrs_type[j] == 1:
+                    columns[j] = np.where(missing, np.nan, data[:, j]).astype(np.float64)
+                else:
+                    columns[j] = self._encode(self._tables[j], np.where(missing, None, data[:, j])).astype(np.int32)
+            if self.task == 'classification':
+                labels = self._encode(self._class_table, data[:, -1]).astype(np.int64)
+            else:
+                labels = data[:, -1].astype(np.float64)
+            yield ColumnData(self.attrs, self.attrs_type, columns, self.categories, labels, np.ones(n), self.classes)
+
+
+class ColumnStore:
+    def __init__(self, directory: str, chunksize=100000):
+        """
+        打开memmap列存储：每个特征、标签和权重各存为一个二进制文件，meta.json记录行数、类型和编码表
+        按块迭代时每块都是memmap上的切片，只有被访问的页才会读入内存
+        :param directory: 列存储目录
+        :param chunksize: 每块的行数
+        """
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.chunksize = chunksize
+        self.task = meta['task']
+        self.attrs = meta['attrs']
+        self.attrs_type = meta['attrs_type']
+        self.n_rows = meta['n_rows']
+        self.categories = [None if table is None else np.array(table, dtype=object) for table in meta['categories']]
+        self.classes = np.array(meta['classes'], dtype=object) if meta['classes'] is not None else None
+        self.columns = [self._open(f"col{j}.bin", dtype) for j, dtype in enumerate(meta['dtypes'])]
+        self.labels = self._open('labels.bin', meta['label_dtype'])
+        self.weights = self._open('weights.bin', 'float64')
+
+    def _open(self, name: str, dtype: str)-> np.ndarray:
+        if self.n_rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, name), dtype=dtype, mode='r', shape=(self.n_rows,))
+
+    @classmethod
+    def write(cls, directory: str, source, chunksize=100000):
+        """
+        把分块数据源（如CSVChunks）逐块追加写入列存储，只需扫描一遍数据源
+        param:
+            directory: 列存储目录
+            source: 可迭代的列式数据块，需有task、attrs、attrs_type、categories、classes属性
+            chunksize: 打开列存储时每块的行数
+        return:
+            store: 打开的列存储
+        """
+        os.makedirs(directory, exist_ok=True)
+        n_features = len(source.attrs)
+        files = [open(os.path.join(directory, f"col{j}.bin"), 'wb') for j in range(n_features)]
+        files += [open(os.path.join(directory, name), 'wb') for name in ('labels.bin', 'weights.bin')]
+        n_rows = 0
+        dtypes = [np.dtype(np.float64 if t == 1 else np.int32).str for t in source.attrs_type]
+        label_dtype = np.dtype(np.int64 if source.task == 'classification' else np.float64).str
+        try:
+            for chunk in source:
+                for j in range(n_features):
+                    files[j].write(np.ascontiguousarray(chunk.columns[j], dtype=dtypes[j]).tobytes())
+                files[-2].write(np.ascontiguousarray(chunk.labels, dtype=label_dtype).tobytes())
+                files[-1].write(np.ascontiguousarray(chunk.weights, dtype='<f8').tobytes())
+                n_rows += len(chunk.labels)
+        finally:
+            for f in files:
+                f.close()
+        meta = {'task': source.task, 'attrs': list(source.attrs), 'attrs_type': list(source.attrs_type), 'n_rows': n_rows,
+                'dtypes': dtypes, 'label_dtype': label_dtype,
+                'categories': to_json_value(source.categories), 'classes': to_json_value(source.classes)}
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return cls(directory, chunksize)
+
+    def __iter__(self):
+        for start in range(0, self.n_rows, self.chunksize):
+            end = min(start + self.chunksize, self.n_rows)
+            columns = [col[start:end] for col in self.columns]
+            yield ColumnData(self.attrs, self.attrs_type, columns, self.categories, self.labels[start:end],
+                             self.weights[start:end], self.classes)
+
+
+class OutOfCoreCART(CART):
+    """
+    外存训练的CART树，划分规则与hist模式相同，训练好的树与CART一样编译、保存和预测
+    """
+
+    def _chunkBins(self, chunk: ColumnData, index: int)-> np.ndarray:
+        """
+        一块数据在某个特征上的分箱编号，缺失值为最后一个箱(n_bins[index])
+        """
+        values = np.asarray(chunk.columns[index])
+        if self.attrs_type[index] == 1:
+            missing = np.isnan(values)
+            bins = np.searchsorted(self.bin_edges[index], np.where(missing, 0.0, values), side='left')
+        else:
+            missing = values < 0
+            bins = values
+        return np.where(missing, self.n_bins[index], bins)
+
+    def _prepare(self, task: str, source)-> np.ndarray:
+        """
+        第一遍扫描：流式分位数摘要求连续特征的分箱边界，同时统计行数和根节点的统计量
+        param:
+            task: 任务类型
+            source: 数据源
+        return:
+            stats: 根节点的统计量
+        """
+        if getattr(source, 'task', task) != task:
+            raise ValueError(f"source was encoded for {source.task}, not {task}")
+        self.attrs = list(source.attrs)
+        self.attrs_type = list(source.attrs_type)
+        n_features = len(self.attrs)
+        capacity = max(8192, 32 * self.max_bins)
+        sketches = {j: QuantileSketch(capacity, self.max_bins) for j in range(n_features) if self.attrs_type[j] == 1}
+        stats = np.zeros(0 if task == 'classification' else 3)
+        self.n_rows = 0
+        for chunk in source:
+            for j, sketch in sketches.items():
+                sketch.update(np.asarray(chunk.columns[j], dtype=np.float64))
+            labels = np.asarray(chunk.labels)
+            weights = np.asarray(chunk.weights, dtype=np.float64)
+            if task == 'classification':
+                counts = np.bincount(labels, weights=weights)
+                stats = np.pad(stats, (0, max(0, len(counts) - len(stats))))
+                stats[:len(counts)] += counts
+            else:
+                stats += [np.sum(weights), np.sum(weights * labels), np.sum(weights * labels**2)]
+            self.n_rows += len(labels)
+        if self.n_rows == 0:
+            raise ValueError("the data source is empty")
+        # 离散特征和类别的编码表在扫描一遍后才完整
+        self.categories = source.categories
+        self.classes = source.classes
+        if task == 'classification':
+            stats = np.pad(stats, (0, len(self.classes) - len(stats)))
+        self.bin_edges = [None] * n_features
+        self.bin_upper = [None] * n_features
+        self.n_bins = [0] * n_features
+        for j in range(n_features):
+            if self.attrs_type[j] == 1:
+                self.bin_edges[j], self.bin_upper[j] = sketches[j].edges(self.max_bins)
+                self.n_bins[j] = len(self.bin_edges[j]) + 1
+            else:
+                self.n_bins[j] = len(self.categories[j])
+        # 统计量计算（_groupStats）只用到数据集的类别表
+        self.dataset = ColumnData(self.attrs, self.attrs_type, [None] * n_features, self.categories,
+                                  np.empty(0, dtype=np.int64), np.empty(0), self.classes)
+        return stats
+
+    def _cacheBins(self, task: str, source, directory: str):
+        """
+        第二遍扫描：把数据源编码为分箱编号写入磁盘缓存，之后逐层的扫描只读缓存，不再读取和解析原始数据
+        缓存中还保存标签、权重和每个样本当前所在的节点编号
+        param:
+            task: 任务类型
+            source: 数据源
+            directory: 缓存目录
+        """
+        def create(name, dtype):
+            return np.memmap(os.path.join(directory, name), dtype=dtype, mode='w+', shape=(self.n_rows,))
+        self._bins = [create(f"bins{j}.bin", np.uint8 if n < 255 else np.uint16 if n < 65535 else np.uint32)
+                      for j, n in enumerate(self.n_bins)]
+        self._labels = create('labels.bin', np.int64 if task == 'classification' else np.float64)
+        self._sample_weights = create('weights.bin', np.float64)
+        self._node = create('node.bin', np.int32)
+        start = 0
+        for chunk in source:
+            end = start + len(chunk.labels)
+            for j in range(len(self.attrs)):
+                self._bins[j][start:end] = self._chunkBins(chunk, j)
+            self._labels[start:end] = chunk.labels
+            self._sample_weights[start:end] = chunk.weights
+            start = end
+        if start != self.n_rows:
+            raise ValueError("the data source returned a different number of rows on the second pass")
+
+    def _addNode(self)-> int:
+        """
+        在扁平的路由表中新建一个节点，返回其编号
+        """
+        self._feature.append(-1)
+        self._left.append(-1)
+        self._scale += [1.0, 1.0]
+        self._split_column.append(-1)
+        return len(self._feature) - 1
+
+    def _route(self, bins: list, start: np.ndarray, weights: np.ndarray, position: np.ndarray)-> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        把一块样本从缓存的节点出发沿已建好的树下推到当前层，缺失样本复制进左右两个子节点，权重按划分时的比例缩放
+        param:
+            bins: 每个特征在这一块上的分箱编号
+            start: 每个样本的出发节点
+            weights: 样本权重
+            position: 节点编号 -> 在当前层中的位置，不在当前层的节点为-1
+        return:
+            rows: 样本在块中的行号（缺失样本可能出现多次）
+            node: 样本所在的当前层位置
+            weights: 样本的权重
+            settled: 每个样本下次扫描的出发节点：只落入一个节点的样本为该节点，被复制的样本从根节点重新下推
+        """
+        feature = np.asarray(self._feature)
+        left = np.asarray(self._left)
+        scale = np.asarray(self._scale).reshape(-1, 2)
+        split_column = np.asarray(self._split_column)
+        settled = start.copy()
+        rows = np.flatnonzero(weights > 0)
+        node = start[rows].astype(np.intp)
+        weights = weights[rows]
+        while True:
+            # 落入已完成的叶节点的样本不再参与训练
+            keep = (feature[node] >= 0) | (position[node] >= 0)
+            settled[rows[~keep]] = node[~keep]
+            rows, node, weights = rows[keep], node[keep], weights[keep]
+            internal = feature[node] >= 0
+            if not np.any(internal):
+                break
+            go_left = np.zeros(len(rows), dtype=bool)
+            missing = np.zeros(len(rows), dtype=bool)
+            for j in np.unique(feature[node[internal]]):
+                in_j = internal & (feature[node] == j)
+                b = bins[j][rows[in_j]]
+                missing[in_j] = b == self.n_bins[j]
+                go_left[in_j] = self._left_bins[j][np.minimum(b, self.n_bins[j] - 1), split_column[node[in_j]]]
+            go_left &= internal & ~missing
+            go_right = internal & ~go_left & ~missing
+            stay = ~internal
+            rows = np.concatenate((rows[stay], rows[go_left], rows[go_right], rows[missing], rows[missing]))
+            weights = np.concatenate((weights[stay], weights[go_left], weights[go_right],
+                                      weights[missing] * scale[node[missing], 0], weights[missing] * scale[node[missing], 1]))
+            node = np.concatenate((node[stay], left[node[go_left]], left[node[go_right]] + 1,
+                                   left[node[missing]], left[node[missing]] + 1))
+        once = np.bincount(rows, minlength=len(settled)) == 1
+        settled[rows] = np.where(once[rows], node, 0)
+        return rows, position[node], weights, settled
+
+    def _accumulate(self, task: str, position: np.ndarray, direct: np.ndarray, n_direct: int,
+                    features: np.ndarray)-> tuple[dict, np.ndarray]:
+        """
+        逐块扫描缓存，累加需要直接统计的节点在各特征上的直方图，以及当前层每个节点的样本数
+        param:
+            task: 任务类型
+            position: 节点编号 -> 在当前层中的位置
+            direct: 当前层位置 -> 在直接统计节点中的位置，不需要直接统计的为-1
+            n_direct: 直接统计的节点数
+            features: 需要统计的特征
+        return:
+            hist: 特征索引 -> (直接统计的节点数, 分箱数+1, 统计量)
+            size: 当前层每个节点的样本数
+        """
+        n_stats = len(self.classes) if task == 'classification' else 3
+        hist = {j: np.zeros((n_direct, self.n_bins[j] + 1, n_stats)) for j in features}
+        size = np.zeros(len(direct), dtype=np.int64)
+        for start in range(0, self.n_rows, self.chunksize):
+            end = min(start + self.chunksize, self.n_rows)
+            bins = [b[start:end] for b in self._bins]
+            rows, node, weights, self._node[start:end] = self._route(bins, np.asarray(self._node[start:end]),
+                                                                      np.asarray(self._sample_weights[start:end]), position)
+            size += np.bincount(node, minlength=len(direct))
+            d = direct[node]
+            selected = d >= 0
+            rows, d, weights = rows[selected], d[selected], weights[selected]
+            labels = np.asarray(self._labels[start:end])[rows]
+            for j in features:
+                n_groups = self.n_bins[j] + 1
+                groups = d * n_groups + bins[j][rows]
+                hist[j] += self._groupStats(task, self.dataset, groups, n_direct * n_groups, labels, weights).reshape(n_direct, n_groups, -1)
+        return hist, size
+
+    def _bestSplits(self, task: str, hist: dict, candidates: np.ndarray)-> tuple[np.ndarray, np.ndarray, dict]:
+        """
+        当前层所有节点在所有特征上的最优划分，缺失箱不参与划分，只有一侧有样本的划分不可用
+        param:
+            task: 任务类型
+            hist: 特征索引 -> (节点数, 分箱数+1, 统计量)
+            candidates: (节点数, 特征数)的候选特征掩码
+        return:
+            best_feature: 每个节点的最优划分特征
+            metric: 每个节点的最优划分指标，没有可用划分时为inf
+            left_bins: 特征索引 -> (节点数, 分箱数)，走向左子树的分箱
+        """
+        n_nodes, n_features = candidates.shape
+        metric = np.full((n_nodes, n_features), inf)
+        left_bins = {}
+        for j in np.flatnonzero(np.any(candidates, axis=0)):
+            stats = hist[j][:, :-1]
+            if self.attrs_type[j] == 0:
+                metric[:, j], left_bins[j] = self.categoricalPartition(task, stats)
+                continue
+            nonempty = self._statsWeight(task, stats) > 0
+            stats_left = np.cumsum(stats, axis=1)
+            stats_right = stats_left[:, -1:] - stats_left
+            n_after = np.cumsum(nonempty[:, ::-1], axis=1)[:, ::-1]
+            calmetric = np.where(nonempty & (n_after > 1), self._splitMetric(task, stats_left, stats_right), inf)
+            best = np.argmin(calmetric, axis=1)
+            metric[:, j] = calmetric[np.arange(n_nodes), best]
+            left_bins[j] = np.arange(stats.shape[1])[None, :] <= best[:, None]
+        metric[~candidates] = inf
+        best_feature = np.argmin(metric, axis=1)
+        return best_feature, metric[np.arange(n_nodes), best_feature], left_bins
+
+    def _leafLabel(self, task: str, stats: np.ndarray):
+        """
+        由节点统计量计算叶节点输出
+        """
+        if task == 'classification':
+            return self.classes[np.argmax(stats)]
+        return float(stats[1] / stats[0]) if stats[0] > 0 else 0.0
+
+    def fitChunks(self, task: str, source, chunksize=None, cache_dir=None)-> Node:
+        """
+        外存训练：第一遍扫描求分箱边界，第二遍把数据编码为分箱写入磁盘缓存，之后每层扫描一遍缓存
+        缓存中记录每个样本所在的节点，每层只需把样本下推一步（被复制的缺失样本除外）；
+        每对兄弟节点中只直接统计权重较小的一个，另一个由父节点直方图相减得到；
+        预剪枝的纯度提升按左右子节点的权重比例计算
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            source: 可重复迭代的列式数据块（CSVChunks、ColumnStore），需有task、attrs、attrs_type、categories、classes属性
+            chunksize: 扫描缓存时每块的行数，默认与数据源相同
+            cache_dir: 缓存所在的目录，默认为系统临时目录，训练结束后删除
+        return:
+            self.root: 根节点
+        """
+        self.task = task
+        self._rng = np.random.default_rng(self.random_state)
+        self.chunksize = chunksize or getattr(source, 'chunksize', 100000)
+        root_stats = self._prepare(task, source)
+        n_features = len(self.attrs)
+        self._n_candidates = self._resolveMaxFeatures(n_features)
+        self.feature_importance = dict.fromkeys(self.attrs, 0.0)
+        with tempfile.TemporaryDirectory(dir=cache_dir) as directory:
+            self._cacheBins(task, source, directory)
+            try:
+                self.root = self._buildLevels(task, root_stats)
+            finally:
+                # 关闭memmap后才能删除缓存目录
+                del self._bins, self._labels, self._sample_weights, self._node
+        return self.root
+
+    def _buildLevels(self, task: str, root_stats: np.ndarray)-> Node:
+        """
+        逐层扫描缓存构建树
+        param:
+            task: 任务类型
+            root_stats: 根节点的统计量
+        return:
+            root: 根节点
+        """
+        n_features = len(self.attrs)
+        self._feature, self._left, self._scale, self._split_column = [], [], [], []
+        # 划分节点走向左子树的分箱：特征索引 -> (分箱数, 按该特征划分的节点数)
+        self._left_bins = {j: np.zeros((self.n_bins[j], 0), dtype=bool) for j in range(n_features)}
+        root = Node()
+        nodes = [(root, self._addNode())]
+        node_stats = root_stats[None, :]
+        avail = np.ones((1, n_features), dtype=bool)
+        # 直方图来源：父节点在上一层中的位置、兄弟节点在当前层中的位置，根节点为-1
+        parent = np.array([-1])
+        sibling = np.array([-1])
+        hist_parent = None
+        depth = 1
+        while nodes:
+            n_nodes = len(nodes)
+            # 不需要扫描数据即可确定的叶节点：类别完全相同、所有特征均已使用、达到最大深度
+            if task == 'classification':
+                leaf = np.count_nonzero(node_stats > 0, axis=1) <= 1
+            else:
+                leaf = node_stats[:, 0] <= 0
+            leaf |= ~np.any(avail, axis=1)
+            if self.max_depth is not None and depth > self.max_depth:
+                leaf[:] = True
+            split = np.zeros(n_nodes, dtype=bool)
+            if not np.all(leaf):
+                # 兄弟节点都需要划分时，权重较大的一个由父节点直方图相减得到
+                weight = self._statsWeight(task, node_stats)
+                other = np.maximum(sibling, 0)
+                derived = ~leaf & (sibling >= 0) & ~leaf[other] & (
+                    (weight > weight[other]) | ((weight == weight[other]) & (np.arange(n_nodes) % 2 == 1)))
+                is_direct = ~leaf & ~derived
+                direct = np.where(is_direct, np.cumsum(is_direct) - 1, -1)
+                position = np.full(len(self._feature), -1, dtype=np.intp)
+                position[[index for _, index in nodes]] = np.arange(n_nodes)
+                features = np.flatnonzero(np.any(avail & ~leaf[:, None], axis=0))
+                hist_direct, size = self._accumulate(task, position, direct, int(np.sum(is_direct)), features)
+                hist = {}
+                for j in features:
+                    hist[j] = np.zeros((n_nodes,) + hist_direct[j].shape[1:])
+                    hist[j][is_direct] = hist_direct[j]
+                    if np.any(derived):
+                        # 兄弟节点直方图 = 父节点直方图 - 直接统计的子节点直方图，相减留下的舍入误差清零
+                        child = hist_parent[j][parent[derived]] - hist[j][sibling[derived]]
+                        total = np.sum(self._statsWeight(task, hist_parent[j][parent[derived]]), axis=1)
+                        child[self._statsWeight(task, child) <= 1e-9 * total[:, None]] = 0.0
+                        hist[j][derived] = child
+                if task == 'regression':
+                    leaf |= size <= self.min_samples_split
+                # 所有可用特征上都只有一个非空分箱（含缺失箱），样本无法再划分
+                same = np.ones(n_nodes, dtype=bool)
+                for j in features:
+                    same &= ~avail[:, j] | (np.count_nonzero(self._statsWeight(task, hist[j]) > 0, axis=1) <= 1)
+                leaf |= same
+                candidates = avail & ~leaf[:, None]
+                if self._n_candidates is not None:
+                    for k in np.flatnonzero(~leaf):
+                        sampled = self.sampleFeatures(list(np.flatnonzero(avail[k])))
+                        candidates[k] = False
+                        candidates[k, sampled] = True
+                best_feature, metric, left_bins = self._bestSplits(task, hist, candidates)
+                split = ~leaf & np.isfinite(metric)
+
+            next_nodes, next_stats, next_avail, next_parent = [], [], [], []
+            for k, (current, index) in enumerate(nodes):
+                current.weight = float(self._statsWeight(task, node_stats[k]))
+                if split[k]:
+                    j = best_feature[k]
+                    stats = hist[j][k]
+                    mask = left_bins[j][k]
+                    stats_left = np.sum(stats[:-1][mask], axis=0)
+                    stats_right = np.sum(stats[:-1][~mask], axis=0)
+                    weight_left = self._statsWeight(task, stats_left)
+                    scale_left = weight_left / (weight_left + self._statsWeight(task, stats_right))
+                    # 缺失样本按左右非缺失样本的权重比例进入两侧
+                    stats_left = stats_left + scale_left * stats[-1]
+                    stats_right = stats_right + (1 - scale_left) * stats[-1]
+                    weight = self._statsWeight(task, node_stats[k])
+                    impurity_decrease = (self._impurityFromStats(task, node_stats[k])
+                                         - self._statsWeight(task, stats_left) / weight * self._impurityFromStats(task, stats_left)
+                                         - self._statsWeight(task, stats_right) / weight * self._impurityFromStats(task, stats_right))
+                    if not impurity_decrease < self.min_impurity_decrease:
+                        current.feature = self.attrs[j]
+                        self.feature_importance[current.feature] += float(weight * impurity_decrease)
+                        current.left = Node()
+                        current.right = Node()
+                        left_index = self._addNode()
+                        self._addNode()
+                        self._feature[index] = j
+                        self._left[index] = left_index
+                        self._scale[2*index:2*index+2] = [scale_left, 1 - scale_left]
+                        self._split_column[index] = self._left_bins[j].shape[1]
+                        self._left_bins[j] = np.column_stack((self._left_bins[j], mask))
+                        avail_left = avail[k].copy()
+                        if self.attrs_type[j] == 0:
+                            current.classlabel = 'cat'
+                            current.threshold = set(self.categories[j][mask])
+                            # 左子树取值唯一时不再使用该特征
+                            avail_left[j] = np.count_nonzero(mask) > 1
+                        else:
+                            current.classlabel = 'num'
+                            current.threshold = float(self.bin_upper[j][np.count_nonzero(mask) - 1])
+                        next_nodes += [(current.left, left_index), (current.right, left_index + 1)]
+                        next_stats += [stats_left, stats_right]
+                        next_avail += [avail_left, avail[k]]
+                        next_parent += [k, k]
+                        continue
+                current.label = self._leafLabel(task, node_stats[k])
+                current.isleaf = True
+
+            nodes = next_nodes
+            node_stats = np.array(next_stats).reshape(len(nodes), len(root_stats))
+            avail = np.array(next_avail, dtype=bool).reshape(len(nodes), n_features)
+            parent = np.array(next_parent, dtype=np.intp)
+            # 第i个划分节点的左右子节点在下一层的位置为2i和2i+1
+            sibling = np.arange(len(nodes)) ^ 1
+            hist_parent = hist if np.any(split) else None
+            depth += 1
+        return root
+
+
+if __name__ == '__main__':
+    import time
+    # 把一份回归数据写成CSV，分别用CSV分块和memmap列存储做外存训练，与内存中的hist模式对比
+    rng = np.random.default_rng(0)
+    n = 200000
+    X = rng.normal(size=(n, 6))
+    group = rng.choice(np.array(['a', 'b', 'c', 'd', 'e']), n)
+    y = 2*X[:, 0] + np.sin(3*X[:, 1]) + X[:, 2]*X[:, 3] + (group == 'c') + 0.1*rng.normal(size=n)
+    attributes = [f"x{i}" for i in range(X.shape[1])] + ['group']
+    attributeProps = [1]*X.shape[1] + [0]
+    frame = pd.DataFrame(X, columns=attributes[:-1])
+    frame['group'] = group
+    frame['y'] = y
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'data.csv')
+        frame.to_csv(csv_path, index=False)
+        data = frame.to_numpy(dtype=object)
+        params = dict(min_samples_split=50, max_depth=8, min_impurity_decrease=1e-3, criterion='weighted')
+        cart = CART(tree_method='hist', **params)
+        start_time = time.time()
+        cart.fit('regression', data, attributes, attributeProps)
+        print(f"in-memory hist: fit {time.time() - start_time:.2f}s, train MSE {np.mean((cart.predict(data[:, :-1], attributes) - y)**2):.4f}")
+        chunks = CSVChunks(csv_path, 'regression', attributes, attributeProps, chunksize=50000)
+        store = ColumnStore.write(os.path.join(tmp_dir, 'store'), chunks, chunksize=50000)
+        for name, source in [('csv chunks', chunks), ('column store', store)]:
+            ooc = OutOfCoreCART(**params)
+            start_time = time.time()
+            ooc.fitChunks('regression', source)
+            print(f"{name}: fit {time.time() - start_time:.2f}s, train MSE {np.mean((ooc.predict(data[:, :-1], attributes) - y)**2):.4f}, "
+                  f"leaves {ooc.root.get_width()}")
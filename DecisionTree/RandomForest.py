@@ -0,0 +1,225 @@
+"""
+随机森林实现（基于CART树）
+"""
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    from .CART import CART, ColumnData
+except ImportError:
+    from CART import CART, ColumnData
+
+
+# 建树/预测的子进程持有的数据，由初始化函数在进程启动时设置
+_forest_worker = {}
+
+def _initForestWorker(meta: dict, task: str, params: dict):
+    """
+    建树子进程初始化：attach共享内存中的数据集
+    :param meta: ColumnData.share返回的描述
+    :param task: 任务类型
+    :param params: CART的参数
+    """
+    dataset = ColumnData.attach(meta)
+    if params['tree_method'] == 'hist':
+        dataset.buildBins(params['max_bins'])
+    _forest_worker.update(dataset=dataset, task=task, params=params)
+
+def _buildForestTree(args: tuple):
+    """
+    构建一棵树：bootstrap抽样以样本权重（抽中次数）的形式传给CART，不复制数据
+    :param args: (随机种子, 是否bootstrap抽样)
+    :return: 根节点
+    """
+    seed, bootstrap = args
+    dataset = _forest_worker['dataset']
+    rng = np.random.default_rng(seed)
+    weights = None
+    if bootstrap:
+        n = len(dataset.labels)
+        weights = np.bincount(rng.integers(0, n, n), minlength=n).astype(np.float64)
+    cart = CART(**_forest_worker['params'], random_state=rng)
+    return cart.fitDataset(_forest_worker['task'], dataset, weights)
+
+def _initPredictWorker(task: str, flat_trees: list, class_maps: list, n_classes: int):
+    """
+    预测子进程初始化：保存所有编译后的树
+    :param task: 任务类型
+    :param flat_trees: 编译后的扁平数组树
+    :param class_maps: 每棵树的类别编码 -> 森林的类别编码，回归为None
+    :param n_classes: 森林的类别数
+    """
+    _forest_worker.update(task=task, flat_trees=flat_trees, class_maps=class_maps, n_classes=n_classes)
+
+def _predictChunk(data: np.ndarray)-> np.ndarray:
+    """
+    所有树对一块样本预测并汇总
+    :param data: 一块测试数据
+    :return: 分类为每个类别的票数(n, K)，回归为所有树的预测值之和(n,)
+    """
+    task = _forest_worker['task']
+    if task == 'classification':
+        votes = np.zeros((len(data), _forest_worker['n_classes']), dtype=np.int64)
+    else:
+        total = np.zeros(len(data))
+    for tree, class_map in zip(_forest_worker['flat_trees'], _forest_worker['class_maps']):
+        values = tree.value[tree.apply(tree.encode(data))]
+        if task == 'classification':
+            votes[np.arange(len(data)), class_map[values.astype(np.intp)]] += 1
+        else:
+            total += values
+    return votes if task == 'classification' else total
+
+
+class RandomForest:
+    def __init__(self, n_estimators=100, max_features='sqrt', bootstrap=True, min_samples_split=2, min_impurity_decrease=0.0,
+                 max_depth=15, tree_method='exact', max_bins=255, n_jobs=1, random_state=None):
+        """
+        初始化随机森林
+        :param n_estimators: 树的数量
+        :param max_features: 每次划分随机抽取的候选特征数，可为整数、比例、'sqrt'、'log2'，None表示使用全部特征
+        :param bootstrap: 是否对每棵树做有放回抽样
+        :param min_samples_split: 节点再分裂所需的最小样本数
+        :param min_impurity_decrease: 分裂后最小纯度提升
+        :param max_depth: 树的最大深度
+        :param tree_method: 划分查找方式，exact或hist
+        :param max_bins: hist模式下连续特征的最大分箱数
+        :param n_jobs: 建树和预测的进程数，-1表示使用全部CPU
+        :param random_state: 随机种子
+        """
+        if tree_method not in ('exact', 'hist'):
+            raise ValueError("tree_method must be 'exact' or 'hist'")
+        self.n_estimators = n_estimators
+        self.max_features = max_features
+        self.bootstrap = bootstrap
+        self.min_samples_split = min_samples_split
+        self.min_impurity_decrease = min_impurity_decrease
+        self.max_depth = max_depth
+        self.tree_method = tree_method
+        self.max_bins = max_bins
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.trees = []
+        self.task = None
+        self.classes = None
+
+    def _treeParams(self)-> dict:
+        """
+        每棵树的CART参数，树内部不再并行；划分指标使用按权重加权的不纯度，bootstrap抽中次数即为权重
+        return:
+            params: CART的参数
+        """
+        return dict(min_samples_split=self.min_samples_split, min_impurity_decrease=self.min_impurity_decrease,
+                    max_depth=self.max_depth, tree_method=self.tree_method, max_bins=self.max_bins,
+                    max_features=self.max_features, criterion='weighted')
+
+    def _nJobs(self)-> int:
+        """
+        实际使用的进程数
+        """
+        return os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+
+    def fit(self, task: str, data: np.ndarray, attrs: list, attrs_type: list):
+        """
+        训练随机森林
+        多进程时数据集只在共享内存中保存一份，每个子进程直接读取
+        param:
+            task: 任务类型，分类(classfication)或回归(regression)
+            data: 训练数据
+            attrs: 特征列表
+            attrs_type: 特征类型
+        return:
+            self.trees: 训练好的CART树
+        """
+        self.task = task
+        dataset = ColumnData.fromArray(task, data, attrs, attrs_type)
+        self.classes = dataset.classes
+        params = self._treeParams()
+        seeds = np.random.SeedSequence(self.random_state).spawn(self.n_estimators)
+        tasks = [(seed, self.bootstrap) for seed in seeds]
+        n_jobs = min(self._nJobs(), self.n_estimators)
+        if n_jobs > 1:
+            meta = dataset.share()
+            try:
+                with multiprocessing.Pool(n_jobs, initializer=_initForestWorker, initargs=(meta, task, params)) as pool:
+                    roots = pool.map(_buildForestTree, tasks)
+            finally:
+                dataset.unshare()
+        else:
+            if self.tree_method == 'hist':
+                dataset.buildBins(self.max_bins)
+            _forest_worker.update(dataset=dataset, task=task, params=params)
+            try:
+                roots = [_buildForestTree(args) for args in tasks]
+            finally:
+                _forest_worker.clear()
+        self.trees = []
+        for root in roots:
+            cart = CART(**params)
+            cart.root = root
+            cart.task = task
+            self.trees.append(cart)
+        return self.trees
+
+    def predict(self, data: np.ndarray, attribute: list, chunk_size=8192)-> np.ndarray:
+        """
+        预测，分类为多数投票，回归为所有树的平均值
+        多进程时按样本分块，每个子进程用所有树预测一块样本并汇总
+        param:
+            data: 测试数据
+            attribute: 特征列表
+            chunk_size: 每块的样本数
+        return:
+            y_pred: 预测值，分类为类别数组，回归为float64数组
+        """
+        if len(data.shape) == 1:
+            data = np.array([data])
+        flat_trees = [cart.compile(attribute) for cart in self.trees]
+        if self.task == 'classification':
+            classes = pd.Index(self.classes)
+            class_maps = [classes.get_indexer(tree.classes) for tree in flat_trees]
+            n_classes = len(self.classes)
+        else:
+            class_maps = [None] * len(flat_trees)
+            n_classes = 0
+        initargs = (self.task, flat_trees, class_maps, n_classes)
+        chunks = [data[i:i+chunk_size] for i in range(0, len(data), chunk_size)]
+        n_jobs = min(self._nJobs(), len(chunks))
+        if n_jobs > 1:
+            with multiprocessing.Pool(n_jobs, initializer=_initPredictWorker, initargs=initargs) as pool:
+                results = pool.map(_predictChunk, chunks)
+        else:
+            _initPredictWorker(*initargs)
+            try:
+                results = [_predictChunk(chunk) for chunk in chunks]
+            finally:
+                _forest_worker.clear()
+        result = np.concatenate(results)
+        if self.task == 'classification':
+            # 票数相同时取类别表中靠前的类别
+            return self.classes[np.argmax(result, axis=1)]
+        return result / len(self.trees)
+
+
+if __name__ == '__main__':
+    import time
+    # 与单棵CART对比：同一份分类数据上的训练耗时和测试集准确率
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(20000, 10))
+    y = np.where(X[:, 0] + X[:, 1]*X[:, 2] + 0.5*rng.normal(size=len(X)) > 0, 'yes', 'no')
+    attributes = [f"x{i}" for i in range(X.shape[1])]
+    data = np.column_stack((X, y)).astype(object)
+    train, test = data[:15000], data[15000:]
+    cart = CART(min_samples_split=2, min_impurity_decrease=0.0, max_depth=15, criterion='weighted')
+    start_time = time.time()
+    cart.fit('classification', train, attributes, [1]*len(attributes))
+    print(f"CART: fit {time.time() - start_time:.2f}s, test accuracy {np.mean(cart.predict(test[:, :-1], attributes) == test[:, -1]):.4f}")
+    for n_jobs in [1, -1]:
+        forest = RandomForest(n_estimators=50, max_depth=15, n_jobs=n_jobs, random_state=0)
+        start_time = time.time()
+        forest.fit('classification', train, attributes, [1]*len(attributes))
+        fit_time = time.time() - start_time
+        accuracy = np.mean(forest.predict(test[:, :-1], attributes) == test[:, -1])
+        print(f"RandomForest(n_jobs={n_jobs}): fit {fit_time:.2f}s, test accuracy {accuracy:.4f}")
@@ -0,0 +1,253 @@
+"""
+决策树的布局与无界面渲染，CART的Node和C4.5的node通用
+一次后序遍历计算并缓存每个子树的宽度（可见叶节点数）和深度，再一次先序遍历按宽度分配横坐标，整体O(n)；
+节点通过_layoutChildren()返回[(边标签, 子节点)]，通过_layoutText()返回节点文本
+大树可以按深度(max_depth)截断，或按训练样本权重保留前top_n个节点，被截断的子树画成一个折叠节点；
+指定路径时直接写文件：图片用Agg/SVG画布渲染，不经过pyplot，不需要显示器；DOT逐行写出，不在内存中拼接
+"""
+import heapq
+import os
+
+LEAF_SLOT = 2.0     # 每个可见叶节点占的横向宽度
+NODE_WIDTH = 1.5
+NODE_HEIGHT = 0.8
+LEVEL_HEIGHT = 2.0
+
+
+def _expanded(root, max_depth=None, top_n=None)-> set:
+    """
+    需要展开（画出子节点）的节点
+    param:
+        root: 根节点
+        max_depth: 只展开深度小于该值的节点（根的深度为0）
+        top_n: 最多画出的节点数，从根开始优先展开训练样本权重最大的节点
+    return:
+        expanded: 展开的节点id集合
+    """
+    expanded = set()
+    if top_n is None:
+        stack = [(root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node.isleaf or (max_depth is not None and depth >= max_depth):
+                continue
+            expanded.add(id(node))
+            stack.extend((child, depth + 1) for _, child in node._layoutChildren())
+        return expanded
+    # 权重相同（或没有训练权重）时按入堆顺序，即广度优先
+    heap = [(-(root.weight or 0.0), 0, root, 0)]
+    count, order = 1, 1
+    while heap:
+        _, _, node, depth = heapq.heappop(heap)
+        if node.isleaf or (max_depth is not None and depth >= max_depth):
+            continue
+        children = node._layoutChildren()
+        if not children or count + len(children) > top_n:
+            continue
+        expanded.add(id(node))
+        count += len(children)
+        for _, child in children:
+            heapq.heappush(heap, (-(child.weight or 0.0), order, child, depth + 1))
+            order += 1
+    return expanded
+
+
+def _subtree_size(root)-> int:
+    """
+    子树的节点数
+    """
+    size = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        size += 1
+        if not node.isleaf:
+            stack.extend(child for _, child in node._layoutChildren())
+    return size
+
+
+def tree_layout(root, max_depth=None, top_n=None)-> list:
+    """
+    计算树的布局
+    param:
+        root: 根节点
+        max_depth: 截断深度，深度不小于该值的内部节点折叠
+        top_n: 最多画出的节点数
+    return:
+        records: 可见节点的先序列表，每项为字典：node、parent（父节点在列表中的位置，根为-1）、edge（边标签）、
+                 depth、children、hidden（折叠的节点数，未折叠为0）、width（子树的可见叶节点数）、
+                 height（子树深度）、x（节点中心横坐标）
+    """
+    expanded = _expanded(root, max_depth, top_n)
+    records = []
+    stack = [(root, -1, None, 0)]
+    while stack:
+        node, parent, edge, depth = stack.pop()
+        index = len(records)
+        records.append({'node': node, 'parent': parent, 'edge': edge, 'depth': depth, 'children': [],
+                        'hidden': 0, 'width': 1, 'height': 1, 'x': 0.0})
+        if parent >= 0:
+            records[parent]['children'].append(index)
+        if id(node) in expanded:
+            stack.extend((child, index, label, depth + 1) for label, child in reversed(node._layoutChildren()))
+        elif not node.isleaf:
+            records[index]['hidden'] = _subtree_size(node) - 1
+    # 后序：先序列表倒序遍历时子节点总在父节点之前
+    for record in reversed(records):
+        if record['children']:
+            record['width'] = sum(records[c]['width'] for c in record['children'])
+            record['height'] = 1 + max(records[c]['height'] for c in record['children'])
+    # 先序：每个节点占[left, left + width)，子节点依次分配
+    lefts = [0.0] * len(records)
+    for index, record in enumerate(records):
+        record['x'] = (lefts[index] + record['width'] / 2) * LEAF_SLOT
+        cursor = lefts[index]
+        for c in record['children']:
+            lefts[c] = cursor
+            cursor += records[c]['width']
+    return records
+
+
+def render_tree(root, path=None, max_depth=None, top_n=None, figsize=None, title=None, dpi=100, max_pixels=16000):
+    """
+    绘制决策树
+    param:
+        root: 根节点
+        path: 输出文件，格式由扩展名决定（.svg、.png、.pdf等）；为None时用pyplot弹出窗口
+        max_depth: 截断深度
+        top_n: 最多画出的节点数
+        figsize: 图形大小（英寸），默认按可见叶节点数和深度确定
+        title: 图形标题
+        dpi: 位图分辨率
+        max_pixels: 位图最长边的像素上限，超过时降低dpi；位图上字号小于4像素时不画文本（文本是绘制的主要开销）
+    return:
+        records: 布局结果（见tree_layout）
+    """
+    import matplotlib
+    from matplotlib.collections import LineCollection, PatchCollection
+    from matplotlib.figure import Figure
+    import matplotlib.patches as patches
+    matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'SimSun', 'Arial Unicode MS']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    records = tree_layout(root, max_depth, top_n)
+    width, height = records[0]['width'], records[0]['height']
+    if figsize is None:
+        figsize = (min(max(12, 1.2 * width), 200), min(max(8, 1.5 * height), 100))
+    # 叶节点多时按每个叶节点分到的图宽缩小字号
+    fontsize = max(1.0, 10 * min(1.0, figsize[0] / (1.2 * width)))
+    dpi = min(dpi, max_pixels / max(figsize))
+    vector = path is not None and os.path.splitext(str(path))[1].lower() in ('.svg', '.pdf', '.eps', '.ps')
+    draw_text = path is None or vector or fontsize * dpi / 72 >= 4
+    if path is None:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=figsize)
+    else:
+        fig = Figure(figsize=figsize)
+    ax = fig.add_subplot()
+
+    # 节点框和连线分别合并为一个集合，避免每个节点一个artist
+    boxes = {'leaf': [], 'inner': [], 'collapsed': []}
+    segments, dashed = [], []
+    for record in records:
+        x, y = record['x'], -record['depth'] * LEVEL_HEIGHT
+        node = record['node']
+        kind = 'leaf' if node.isleaf else 'collapsed' if record['hidden'] else 'inner'
+        if kind == 'leaf':
+            box = patches.FancyBboxPatch((x - NODE_WIDTH/2, y - NODE_HEIGHT/2), NODE_WIDTH, NODE_HEIGHT,
+                                         boxstyle=patches.BoxStyle("Round", pad=0.2))
+        else:
+            box = patches.Rectangle((x - NODE_WIDTH/2, y - NODE_HEIGHT/2), NODE_WIDTH, NODE_HEIGHT)
+        boxes[kind].append(box)
+        if draw_text:
+            text = node._layoutText()
+            if record['hidden']:
+                text += f"\n... 折叠{record['hidden']}个节点"
+            ax.text(x, y, text, ha='center', va='center', fontsize=fontsize)
+        if record['parent'] >= 0:
+            parent = records[record['parent']]
+            px, py = parent['x'], -parent['depth'] * LEVEL_HEIGHT
+            segment = [(px, py - NODE_HEIGHT/2), (x, y + NODE_HEIGHT/2)]
+            (dashed if record['hidden'] else segments).append(segment)
+            if draw_text:
+                ax.text((px + x) / 2, (py + y) / 2, str(record['edge']), ha='center', va='center', fontsize=0.8 * fontsize,
+                        bbox=dict(facecolor='white', alpha=0.7, edgecolor='none'))
+    colors = {'leaf': 'lightgreen', 'inner': 'lightblue', 'collapsed': 'lightyellow'}
+    for kind, patch_list in boxes.items():
+        if patch_list:
+            ax.add_collection(PatchCollection(patch_list, facecolor=colors[kind], edgecolor='black', alpha=0.7,
+                                              match_original=False, zorder=2))
+    ax.add_collection(LineCollection(segments, colors='black', linewidths=1, zorder=1))
+    if dashed:
+        ax.add_collection(LineCollection(dashed, colors='black', linewidths=1, linestyles='dashed', zorder=1))
+
+    total_width = max(width * LEAF_SLOT, 10)
+    center = records[0]['x']
+    ax.set_xlim(center - total_width/2, center + total_width/2)
+    ax.set_ylim(-height * LEVEL_HEIGHT, 1)
+    if title:
+        ax.set_title(title)
+    ax.axis('off')
+    # tight_layout需要测量每个文本的范围，节点多时很慢，直接给定边距
+    fig.subplots_adjust(left=0.01, right=0.99, bottom=0.01, top=0.95 if title else 0.99)
+    if path is None:
+        plt.show()
+    else:
+        # SVG中文本保留为<text>而不是逐字形转成路径，节点多时文件小、写出快
+        with matplotlib.rc_context({'svg.fonttype': 'none'}):
+            fig.savefig(path, dpi=dpi)
+    return records
+
+
+def _dot_text(text: str)-> str:
+    return str(text).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def iter_dot(root, max_depth=None, top_n=None, node_id=0):
+    """
+    逐行生成graphviz dot语句（不含digraph头尾），节点按先序编号
+    param:
+        root: 根节点
+        max_depth: 截断深度
+        top_n: 最多输出的节点数
+        node_id: 根节点的编号
+    return:
+        生成器，每次一行
+    """
+    expanded = _expanded(root, max_depth, top_n)
+    next_id = node_id
+    stack = [(root, None, None)]
+    while stack:
+        node, parent_id, edge = stack.pop()
+        this_id = next_id
+        next_id += 1
+        text = _dot_text(node._layoutText())
+        if node.isleaf:
+            yield f'    node{this_id} [label="{text}", shape=box, style=filled, color=lightgrey];'
+        elif id(node) in expanded:
+            yield f'    node{this_id} [label="{text}"];'
+            stack.extend((child, this_id, label) for label, child in reversed(node._layoutChildren()))
+        else:
+            hidden = _subtree_size(node) - 1
+            yield f'    node{this_id} [label="{text}\\n... 折叠{hidden}个节点", shape=box, style=dashed];'
+        if parent_id is not None:
+            yield f'    node{parent_id} -> node{this_id} [label="{_dot_text(edge)}"];'
+
+
+def write_dot(root, file, max_depth=None, top_n=None, name='Tree'):
+    """
+    把树写成graphviz dot文件，逐行写出
+    param:
+        root: 根节点
+        file: 文件路径或可写的文本文件对象
+        max_depth: 截断深度
+        top_n: 最多输出的节点数
+        name: 图名
+    """
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'w', encoding='utf-8') as f:
+            write_dot(root, f, max_depth, top_n, name)
+        return
+    file.write(f'digraph {name} {{\n    node [fontname="FangSong"];\n')
+    for line in iter_dot(root, max_depth, top_n):
+        file.write(line + '\n')
+    file.write('}\n')
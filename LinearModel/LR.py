@@ -1,4 +1,8 @@
+import warnings
 import numpy as np
+import scipy.linalg
+import scipy.sparse
+import scipy.special
 import matplotlib.pyplot as plt
 from sklearn.model_selection import train_test_split
 from sklearn.datasets import make_classification
@@ -48,66 +52,500 @@ def generate_classification_data(n_samples=100, n_features=2, random_state=42):
     return X, y.reshape(-1, 1)
 
 
+def as_matrix(X):
+    """
+    把特征数据转为float64：scipy.sparse稀疏矩阵转为CSR（只存非零元），其余转为ndarray
+
+    参数:
+    X: ndarray/memmap/scipy.sparse, 特征数据
+
+    返回:
+    CSR矩阵或ndarray
+    """
+    if scipy.sparse.issparse(X):
+        return scipy.sparse.csr_matrix(X, dtype=np.float64)
+    return np.asarray(X, dtype=np.float64)
+
+
+def iter_blocks(X, y=None, chunk_size=65536):
+    """
+    按行分块读取训练数据
+
+    参数:
+    X: ndarray/memmap/CSR, 特征数据；y为None时为产生(X_block, y_block)的可迭代对象
+    y: ndarray/memmap, 目标变量
+    chunk_size: int, 每块的行数（只在X为数组时使用）
+
+    返回:
+    生成器，每次产生一块(X_block, y_block)，X_block为float64数组或CSR矩阵
+    """
+    if y is None:
+        for X_block, y_block in X:
+            yield as_matrix(X_block), np.asarray(y_block, dtype=np.float64)
+        return
+    if scipy.sparse.issparse(X):
+        X = scipy.sparse.csr_matrix(X)
+    for start in range(0, X.shape[0], chunk_size):
+        yield as_matrix(X[start:start + chunk_size]), np.asarray(y[start:start + chunk_size], dtype=np.float64)
+
+
+class NormalEquations:
+    """
+    最小二乘的流式累加器，截距项隐式处理（不拼接全1列），内存只与特征数d有关
+    solver为cholesky或svd时累加 XᵀX、Xᵀy（含截距的(d+1)×(d+1)矩阵）；
+    solver为qr时做TSQR：保留到目前为止的R因子和Qᵀy，每来一块对[R; X_block]重新做QR，不会像XᵀX那样把条件数平方
+    各分片上的累加器可以merge后再求解，结果与在全部数据上拟合相同
+    """
+    SOLVERS = ('cholesky', 'qr', 'svd')
+
+    def __init__(self, solver='cholesky'):
+        if solver not in self.SOLVERS:
+            raise ValueError(f"solver must be one of {self.SOLVERS}, got {solver!r}")
+        self.solver = solver
+        self.n_samples = 0
+        self.xtx = None     # cholesky/svd: 含截距的XᵀX
+        self.xty = None     # cholesky/svd: 含截距的Xᵀy
+        self.R = None       # qr: R因子
+        self.qty = None     # qr: Qᵀy
+        self.ndim = None    # y的维数，用于还原权重形状
+
+    def update(self, X_block, y_block):
+        """
+        累加一块数据
+
+        参数:
+        X_block: ndarray/CSR, (n, d) 特征，稀疏时XᵀX按非零元计算（qr需要把块转为稠密）
+        y_block: ndarray, (n,) 或 (n, k) 目标变量
+
+        返回:
+        self
+        """
+        X_block = as_matrix(X_block)
+        y_block = np.asarray(y_block, dtype=np.float64)
+        if self.ndim is None:
+            self.ndim = y_block.ndim
+        y_block = y_block.reshape(X_block.shape[0], -1)
+        self.n_samples += X_block.shape[0]
+        if self.solver == 'qr':
+            if scipy.sparse.issparse(X_block):
+                X_block = X_block.toarray()
+            Xb = np.hstack((X_block, np.ones((X_block.shape[0], 1))))
+            if self.R is not None:
+                Xb = np.vstack((self.R, Xb))
+                y_block = np.vstack((self.qty, y_block))
+            self._stackQR(Xb, y_block)
+            return self
+        d = X_block.shape[1]
+        xtx = np.empty((d + 1, d + 1))
+        gram = X_block.T @ X_block
+        xtx[:d, :d] = gram.toarray() if scipy.sparse.issparse(gram) else gram
+        xtx[:d, d] = xtx[d, :d] = np.asarray(X_block.sum(axis=0)).ravel()
+        xtx[d, d] = X_block.shape[0]
+        xty = np.vstack((X_block.T @ y_block, y_block.sum(axis=0, keepdims=True)))
+        if self.xtx is None:
+            self.xtx, self.xty = xtx, xty
+        else:
+            self.xtx += xtx
+            self.xty += xty
+        return self
+
+    def _stackQR(self, A, b):
+        """
+        对堆叠后的[A | b]做QR，保留R和Qᵀb
+        """
+        Q, R = np.linalg.qr(A)
+        self.R, self.qty = R, Q.T @ b
+
+    def merge(self, other):
+        """
+        合并另一个分片的累加结果
+
+        参数:
+        other: NormalEquations, 同一solver、同样特征数的累加器
+
+        返回:
+        self
+        """
+        if other.solver != self.solver:
+            raise ValueError("can only merge accumulators with the same solver")
+        if other.n_samples == 0:
+            return self
+        if self.n_samples == 0:
+            self.__dict__.update({k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in other.__dict__.items()})
+            return self
+        self.n_samples += other.n_samples
+        if self.solver == 'qr':
+            self._stackQR(np.vstack((self.R, other.R)), np.vstack((self.qty, other.qty)))
+        else:
+            self.xtx += other.xtx
+            self.xty += other.xty
+        return self
+
+    def solve(self):
+        """
+        求解最小二乘，截距在最后一个系数
+
+        返回:
+        weights: ndarray, (d+1,) 或 (d+1, k) 回归系数
+        """
+        if self.n_samples == 0:
+            raise ValueError("no samples have been accumulated")
+        if self.solver == 'qr':
+            diag = np.abs(np.diag(self.R))
+            if self.R.shape[0] == self.R.shape[1] and diag.min() > diag.max() * self.R.shape[0] * np.finfo(np.float64).eps:
+                weights = scipy.linalg.solve_triangular(self.R, self.qty)
+            else:
+                # 秩亏时取最小范数解
+                weights = np.linalg.lstsq(self.R, self.qty, rcond=None)[0]
+        elif self.solver == 'cholesky':
+            try:
+                weights = scipy.linalg.cho_solve(scipy.linalg.cho_factor(self.xtx), self.xty)
+            except np.linalg.LinAlgError:
+                warnings.warn("XᵀX is not positive definite, falling back to the SVD solver")
+                weights = np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0]
+        else:
+            weights = np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0]
+        return weights[:, 0] if self.ndim == 1 else weights
+
+
 class LinearRegression:
     def __init__(self, learning_rate=0.01, num_iterations=1000):
         self.learning_rate = learning_rate
         self.num_iterations = num_iterations
         self.weights = None
+        self.normal_equations = None     # 分块训练的累加器，可继续update或与其他分片merge后重新solve
+        self.loss_history = []           # 逻辑回归每次迭代（sgd为每轮）的损失
+        self.n_iter_ = 0                 # 逻辑回归实际迭代次数
+        self.optimizer_state = None      # partial_fit的优化器状态（累加器、步数、已见样本数）
 
 
     
     def sigmoid(self,x):
-        return 1/(1+np.exp(-x))
+        return scipy.special.expit(x)
 
-    def linear_regression(self, X_train, y_train):
+    def linear_regression(self, X_train, y_train=None, solver='cholesky', chunk_size=None):
         """
         使用线性回归拟合训练数据
 
         参数:
-        X_train: ndarray, 训练特征数据
-        y_train: ndarray, 训练目标变量
+        X_train: ndarray/memmap/scipy.sparse, 训练特征数据；y_train为None时为产生(X_block, y_block)的可迭代对象（分块训练）
+        y_train: ndarray/memmap, 训练目标变量
+        solver: str, cholesky（正规方程的Cholesky分解，最快）、qr（QR分解，条件数不平方）、
+                svd（最小范数解，特征共线时也能求解）
+        chunk_size: int, 按行分块累加，内存只需O(d²)；为None且传入数组时一次处理
         """
-        b = np.ones((X_train.shape[0],1))
-        b.reshape(-1,1)
-        X_train = np.hstack((X_train,b))
-        self.weights = np.linalg.inv(X_train.T.dot(X_train)).dot(X_train.T).dot(y_train)
+        if y_train is not None and chunk_size is None and solver == 'svd' and not scipy.sparse.issparse(X_train):
+            # 整块数据直接对设计矩阵做SVD，比在XᵀX上求解精确
+            X_b = self._add_intercept(np.asarray(X_train, dtype=np.float64))
+            self.weights = np.linalg.lstsq(X_b, np.asarray(y_train, dtype=np.float64), rcond=None)[0]
+            return
+        self.normal_equations = NormalEquations(solver)
+        if y_train is None:
+            blocks = iter_blocks(X_train)
+        else:
+            blocks = iter_blocks(X_train, y_train, chunk_size or max(X_train.shape[0], 1))
+        for X_block, y_block in blocks:
+            self.normal_equations.update(X_block, y_block)
+        self.weights = self.normal_equations.solve()
+
+    def linear_classification(self, X_train, y_train, circle=100, alpha=0.1, solver='auto', tol=1e-6,
+                              batch_size=256, schedule='invscaling', n_iter_no_change=5, random_state=None):
+        """
+        使用线性分类（逻辑回归）拟合训练数据，最小化平均对数损失
 
-    def linear_classification(self, X_train, y_train, circle, alpha):
+        参数:
+        X_train: ndarray/scipy.sparse, 训练特征数据，稀疏矩阵按CSR处理，计算量与非零元个数成正比
+        y_train: ndarray, 训练目标变量（0/1）
+        circle: int, 最大迭代次数（newton/lbfgs/gd为迭代步数，sgd为遍历数据的轮数）
+        alpha: float, gd/sgd的学习率（sgd为初始学习率）
+        solver: str, newton（牛顿法/IRLS，特征少时几步收敛）、lbfgs（拟牛顿，特征较多时）、
+                sgd（打乱后的小批量随机梯度，样本多时）、gd（全量梯度下降）；auto时特征数不超过200用newton，否则lbfgs
+        tol: float, 提前停止的容差：梯度无穷范数小于tol，或损失的相对变化小于tol
+        batch_size: int, sgd的批大小
+        schedule: str, sgd的学习率策略：constant（不变）、invscaling（alpha/sqrt(轮数)）、
+                  adaptive（损失连续不下降时学习率除以5）
+        n_iter_no_change: int, sgd连续多少轮损失下降不足tol时停止
+        random_state: int, sgd打乱顺序的随机种子
+
+        批量训练会丢弃partial_fit的优化器状态（累加器、步数、已见样本数），之后的partial_fit从本次训练的权重开始、
+        用新的优化器状态重新计数
+        """
+        # 截距隐式处理：权重最后一项为截距，不拼接全1列，稀疏矩阵保持稀疏
+        X_b = as_matrix(X_train)
+        y = np.asarray(y_train, dtype=np.float64).reshape(-1)
+        if solver == 'auto':
+            solver = 'newton' if X_b.shape[1] <= 200 else 'lbfgs'
+        w = np.zeros(X_b.shape[1] + 1)
+        self.loss_history = []
+        self.optimizer_state = None
+        if solver == 'newton':
+            w = self._newton(X_b, y, w, circle, tol)
+        elif solver == 'lbfgs':
+            w = self._lbfgs(X_b, y, w, circle, tol)
+        elif solver == 'sgd':
+            w = self._sgd(X_b, y, w, circle, alpha, tol, batch_size, schedule, n_iter_no_change, random_state)
+        elif solver == 'gd':
+            w = self._gd(X_b, y, w, circle, alpha, tol)
+        else:
+            raise ValueError(f"unknown solver {solver!r}")
+        self.weights = w.reshape(-1, 1)
+
+    def _decision(self, X, w):
+        """
+        线性部分 Xw + b，权重最后一项为截距，X可以是CSR矩阵
+        """
+        return X @ w[:-1] + w[-1]
+
+    def _logistic_loss(self, X_b, y, w):
         """
-        使用线性分类拟合训练数据
+        平均对数损失及其梯度
+
+        返回:
+        loss: float, 损失
+        grad: ndarray, 梯度（最后一项为截距的梯度）
+        h: ndarray, 每个样本的预测概率
+        """
+        z = self._decision(X_b, w)
+        h = self.sigmoid(z)
+        loss = np.mean(np.logaddexp(0, z) - y * z)
+        r = h - y
+        grad = np.append(X_b.T @ r, r.sum()) / X_b.shape[0]
+        return loss, grad, h
+
+    def _logistic_hessian(self, X_b, h):
+        """
+        对数损失的Hessian（含截距行列），稀疏时XᵀSX按非零元计算
+        """
+        n, d = X_b.shape
+        s = h * (1 - h)
+        hessian = np.empty((d + 1, d + 1))
+        if scipy.sparse.issparse(X_b):
+            hessian[:d, :d] = (X_b.T @ (scipy.sparse.diags(s) @ X_b)).toarray()
+        else:
+            hessian[:d, :d] = (X_b * s[:, None]).T @ X_b
+        hessian[:d, d] = hessian[d, :d] = X_b.T @ s
+        hessian[d, d] = s.sum()
+        return hessian / n
+
+    def _converged(self, loss, grad, tol):
+        """
+        提前停止判断：梯度足够小，或相邻两次损失的相对变化足够小
+        """
+        previous = self.loss_history[-1] if self.loss_history else None
+        self.loss_history.append(loss)
+        if np.max(np.abs(grad)) < tol:
+            return True
+        return previous is not None and abs(previous - loss) <= tol * max(1.0, abs(loss))
+
+    def _gd(self, X_b, y, w, circle, alpha, tol):
+        """
+        全量梯度下降
+        """
+        for self.n_iter_ in range(1, circle + 1):
+            loss, grad, _ = self._logistic_loss(X_b, y, w)
+            if self._converged(loss, grad, tol):
+                break
+            w = w - alpha * grad
+        return w
+
+    def _newton(self, X_b, y, w, circle, tol):
+        """
+        牛顿法（IRLS）：每步解 (XᵀSX/n) Δ = 梯度，S为h(1-h)的对角阵；损失不下降时步长减半
+        数据线性可分时权重会不断增大，靠损失相对变化的容差停止
+        """
+        loss, grad, h = self._logistic_loss(X_b, y, w)
+        for self.n_iter_ in range(1, circle + 1):
+            if self._converged(loss, grad, tol):
+                break
+            hessian = self._logistic_hessian(X_b, h)
+            hessian[np.diag_indices(len(w))] += 1e-10
+            try:
+                step = scipy.linalg.cho_solve(scipy.linalg.cho_factor(hessian), grad)
+            except np.linalg.LinAlgError:
+                step = np.linalg.lstsq(hessian, grad, rcond=None)[0]
+            t = 1.0
+            while True:
+                new_w = w - t * step
+                new_loss, new_grad, new_h = self._logistic_loss(X_b, y, new_w)
+                if new_loss <= loss or t < 1e-10:
+                    break
+                t /= 2
+            w, loss, grad, h = new_w, new_loss, new_grad, new_h
+        return w
+
+    def _lbfgs(self, X_b, y, w, circle, tol, memory=10):
+        """
+        L-BFGS：保存最近memory对(s, y)，两步循环求搜索方向，Armijo回溯线搜索
+        """
+        loss, grad, _ = self._logistic_loss(X_b, y, w)
+        s_list, y_list = [], []
+        for self.n_iter_ in range(1, circle + 1):
+            if self._converged(loss, grad, tol):
+                break
+            q = grad.copy()
+            rhos, alphas = [], []
+            for s_k, y_k in zip(reversed(s_list), reversed(y_list)):
+                rho = 1.0 / y_k.dot(s_k)
+                a = rho * s_k.dot(q)
+                q -= a * y_k
+                rhos.append(rho)
+                alphas.append(a)
+            if s_list:
+                q *= s_list[-1].dot(y_list[-1]) / y_list[-1].dot(y_list[-1])
+            for (s_k, y_k), rho, a in zip(zip(s_list, y_list), reversed(rhos), reversed(alphas)):
+                q += s_k * (a - rho * y_k.dot(q))
+            direction = -q
+            slope = grad.dot(direction)
+            if slope >= 0:
+                # 方向不是下降方向时丢弃历史，退回最速下降
+                s_list, y_list = [], []
+                direction, slope = -grad, -grad.dot(grad)
+            t = 1.0
+            while True:
+                new_w = w + t * direction
+                new_loss, new_grad, _ = self._logistic_loss(X_b, y, new_w)
+                if new_loss <= loss + 1e-4 * t * slope or t < 1e-10:
+                    break
+                t /= 2
+            s_k, y_k = new_w - w, new_grad - grad
+            if y_k.dot(s_k) > 1e-12:
+                s_list.append(s_k)
+                y_list.append(y_k)
+                if len(s_list) > memory:
+                    s_list.pop(0)
+                    y_list.pop(0)
+            w, loss, grad = new_w, new_loss, new_grad
+        return w
+
+    def _sgd(self, X_b, y, w, circle, alpha, tol, batch_size, schedule, n_iter_no_change, random_state):
+        """
+        打乱顺序的小批量随机梯度下降，每轮用各批损失的平均值判断是否提前停止
+        """
+        rng = np.random.default_rng(random_state)
+        n = X_b.shape[0]
+        eta = alpha
+        best_loss, no_change = np.inf, 0
+        for self.n_iter_ in range(1, circle + 1):
+            if schedule == 'invscaling':
+                eta = alpha / np.sqrt(self.n_iter_)
+            order = rng.permutation(n)
+            epoch_loss = 0.0
+            for start in range(0, n, batch_size):
+                rows = order[start:start + batch_size]
+                loss, grad, _ = self._logistic_loss(X_b[rows], y[rows], w)
+                epoch_loss += loss * len(rows)
+                w = w - eta * grad
+            epoch_loss /= n
+            self.loss_history.append(epoch_loss)
+            if epoch_loss > best_loss - tol * max(1.0, abs(best_loss)):
+                no_change += 1
+            else:
+                no_change = 0
+            best_loss = min(best_loss, epoch_loss)
+            if no_change >= n_iter_no_change:
+                if schedule != 'adaptive' or eta < 1e-6:
+                    break
+                eta /= 5
+                no_change = 0
+        return w
+
+    def partial_fit(self, X_batch, y_batch, optimizer='adagrad', learning_rate=None, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        """
+        用一个小批量增量训练逻辑回归：只用当前批计算一次梯度并更新，不需要回放历史数据
+        优化器状态（自适应学习率的累加器、步数、已见样本数）保存在optimizer_state中，可用state_dict保存、load_state_dict恢复；
+        已经用linear_classification训练过时从其权重继续，优化器状态从零开始（批量训练会清空optimizer_state）
 
         参数:
-        X_train: ndarray, 训练特征数据
-        y_train: ndarray, 训练目标变量
+        X_batch: ndarray/scipy.sparse, 一批特征数据
+        y_batch: ndarray, 一批目标变量（0/1）
+        optimizer: str, adagrad（按各维梯度平方和缩放学习率）、adam（一阶、二阶矩估计）或
+                   sgd（学习率按 1/sqrt(步数) 衰减），只在第一次调用时生效
+        learning_rate: float, 学习率，默认用构造时的learning_rate，只在第一次调用时生效
+        beta1, beta2: float, adam的一阶、二阶矩衰减率
+        epsilon: float, 防止除零的小量
+
+        返回:
+        self
         """
-        b = np.ones((X_train.shape[0],1))
-        b.reshape(-1,1)
-        # X_train = np.hstack((X_train,b))
-        X_train = np.concatenate((X_train,b),axis=1)
-        self.weights = np.zeros((X_train.shape[1], 1))
-
-        dw = np.zeros((X_train.shape[1],1))
-        for i in range(circle):
-            z = X_train.dot(self.weights)
-            h = self.sigmoid(z)
-            dw = (1 / X_train.shape[0])*X_train.T.dot(h - y_train)
-            self.weights -= alpha * dw 
-            # dw = X_train.T.dot(self.sigmoid(X_train.dot(self.weights)) - y_train) 
-            # self.weights -= alpha * dw / X_train.shape[0]
-        
+        X_b = as_matrix(X_batch)
+        y = np.asarray(y_batch, dtype=np.float64).reshape(-1)
+        if self.optimizer_state is None:
+            if optimizer not in ('adagrad', 'adam', 'sgd'):
+                raise ValueError(f"unknown optimizer {optimizer!r}")
+            d = X_b.shape[1] + 1
+            if self.weights is None:
+                self.weights = np.zeros((d, 1))
+            self.optimizer_state = {'optimizer': optimizer,
+                                    'learning_rate': self.learning_rate if learning_rate is None else learning_rate,
+                                    'beta1': beta1, 'beta2': beta2, 'epsilon': epsilon,
+                                    'steps': 0, 'n_samples_seen': 0,
+                                    'grad_sq': np.zeros(d), 'm': np.zeros(d), 'v': np.zeros(d)}
+        state = self.optimizer_state
+        w = self.weights[:, 0]
+        if X_b.shape[1] + 1 != len(w):
+            raise ValueError(f"expected {len(w) - 1} features, got {X_b.shape[1]}")
+        loss, grad, _ = self._logistic_loss(X_b, y, w)
+        state['steps'] += 1
+        state['n_samples_seen'] += X_b.shape[0]
+        eta = state['learning_rate']
+        if state['optimizer'] == 'adagrad':
+            state['grad_sq'] += grad ** 2
+            w = w - eta * grad / (np.sqrt(state['grad_sq']) + state['epsilon'])
+        elif state['optimizer'] == 'adam':
+            state['m'] = state['beta1'] * state['m'] + (1 - state['beta1']) * grad
+            state['v'] = state['beta2'] * state['v'] + (1 - state['beta2']) * grad ** 2
+            m_hat = state['m'] / (1 - state['beta1'] ** state['steps'])
+            v_hat = state['v'] / (1 - state['beta2'] ** state['steps'])
+            w = w - eta * m_hat / (np.sqrt(v_hat) + state['epsilon'])
+        else:
+            w = w - eta / np.sqrt(state['steps']) * grad
+        self.weights = w.reshape(-1, 1)
+        self.loss_history.append(loss)
+        return self
+
+    def state_dict(self):
+        """
+        导出增量训练的状态（权重和优化器状态的副本），只包含numpy数组和标量，可直接pickle或np.savez保存
+
+        返回:
+        dict, 状态
+        """
+        if self.weights is None:
+            raise ValueError("模型尚未训练！请先调用 fit 方法。")
+        state = {'weights': self.weights.copy(), 'loss_history': np.asarray(self.loss_history, dtype=np.float64)}
+        if self.optimizer_state is not None:
+            state.update({f"optimizer.{key}": (value.copy() if isinstance(value, np.ndarray) else value)
+                          for key, value in self.optimizer_state.items()})
+        return state
+
+    def load_state_dict(self, state):
+        """
+        从state_dict的结果恢复，之后的partial_fit与未中断时完全相同
+
+        参数:
+        state: dict, state_dict的结果（也可以是np.load读出的npz）
+        """
+        self.weights = np.array(state['weights'], dtype=np.float64)
+        self.loss_history = list(np.asarray(state['loss_history'], dtype=np.float64))
+        optimizer_state = {key[len('optimizer.'):]: state[key] for key in state.keys() if key.startswith('optimizer.')}
+        for key, value in optimizer_state.items():
+            value = np.array(value)
+            optimizer_state[key] = value.item() if value.ndim == 0 else value.astype(np.float64)
+        self.optimizer_state = optimizer_state or None
 
     def _add_intercept(self, X):
         """
-        在特征矩阵 X 的第一列添加截距项（全为 1）
+        在特征矩阵 X 的最后一列添加截距项（全为 1），训练和预测已改为隐式截距，不再需要拼接
 
         Args:
-            X (ndarray): 特征矩阵 (n_samples, n_features).
+            X (ndarray/scipy.sparse): 特征矩阵 (n_samples, n_features).
 
         Returns:
-            ndarray: 添加了截距项的特征矩阵 (n_samples, n_features + 1).
+            ndarray/CSR: 添加了截距项的特征矩阵 (n_samples, n_features + 1).
         """
         intercept = np.ones((X.shape[0], 1))
-        intercept.reshape(-1,1)
+        if scipy.sparse.issparse(X):
+            return scipy.sparse.hstack((X, intercept), format='csr')
         return np.hstack((X,intercept))
         # return np.concatenate((X,intercept),axis=1)
 
@@ -116,16 +554,15 @@ class LinearRegression:
         预测样本属于类别 1 的概率
 
         Args:
-            X (ndarray): 特征数据 (n_samples, n_features).
+            X (ndarray/scipy.sparse): 特征数据 (n_samples, n_features).
 
         Returns:
             ndarray: 每个样本属于类别 1 的概率 (n_samples, 1).
         """
         if self.weights is None:
             raise ValueError("模型尚未训练！请先调用 fit 方法。")
-        X_b = self._add_intercept(X)
-        z = X_b.dot(self.weights)
-        return self.sigmoid(z)
+        z = self._decision(as_matrix(X), self.weights[:, 0])
+        return self.sigmoid(z).reshape(-1, 1)
 
     def plot_regression_line(X, y, w):
         """
@@ -195,7 +632,7 @@ class LinearRegression:
         预测样本的类别标签
 
         Args:
-            X (ndarray): 特征数据 (n_samples, n_features).
+            X (ndarray/scipy.sparse): 特征数据 (n_samples, n_features).
             threshold (float): 概率阈值，用于区分类别 0 和 1.
 
         Returns:
@@ -218,7 +655,7 @@ if __name__ == "__main__":
     print("训练集形状:", X_train.shape, y_train.shape)
     print("测试集形状:", X_test.shape, y_test.shape)
     model = LinearRegression()
-    model.linear_classification(X_train, y_train,20000,0.1)
+    model.linear_classification(X_train, y_train)
     # 预测测试集
     y_pred = model.predict(X_test)
 
@@ -0,0 +1,65 @@
+"""
+仓库内GBDT与xgboost(tree_method='exact')的对比，数据与xgb_start.py相同
+"""
+import os
+import sys
+import time
+import numpy as np
+import xgboost as xgb
+from sklearn.model_selection import train_test_split
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DecisionTree'))
+from GBDT import GBDT
+
+#%%
+
+# 生成包含1000个样本的随机数据集
+np.random.seed(0)
+X = np.random.rand(1000, 10)
+y = (X[:, 0] + X[:, 1] > 1).astype(int)
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
+
+num_boost_round = 500
+eta = 0.5
+max_depth = 5
+reg_lambda = 1.0
+
+#%%
+
+def logloss(y_true, p):
+    p = np.clip(p, 1e-15, 1 - 1e-15)
+    return float(-np.mean(y_true * np.log(p) + (1 - y_true) * np.log(1 - p)))
+
+# xgboost
+dtrain = xgb.DMatrix(X_train, label=y_train)
+dtest = xgb.DMatrix(X_test, label=y_test)
+parameters = {
+    "objective": "binary:logistic",
+    "eta": eta,
+    "max_depth": max_depth,
+    "lambda": reg_lambda,
+    "min_child_weight": 0,
+    "subsample": 1,
+    "tree_method": "exact",
+    "nthread": 1,
+}
+start_time = time.time()
+model = xgb.train(parameters, dtrain, num_boost_round=num_boost_round)
+xgb_time = time.time() - start_time
+xgb_pred = model.predict(dtest)
+
+# 仓库内GBDT
+attributes = [f"x{i}" for i in range(X.shape[1])]
+train_data = np.column_stack((X_train, y_train))
+gbdt = GBDT('logistic', n_estimators=num_boost_round, learning_rate=eta, max_depth=max_depth, reg_lambda=reg_lambda)
+start_time = time.time()
+gbdt.fit(train_data, attributes, [1]*len(attributes))
+gbdt_time = time.time() - start_time
+gbdt_pred = gbdt.predict(X_test, attributes)
+
+#%%
+
+for name, fit_time, pred in [("xgboost exact", xgb_time, xgb_pred), ("GBDT", gbdt_time, gbdt_pred)]:
+    accuracy = np.mean((pred >= 0.5) == y_test)
+    print(f"{name}: fit {fit_time:.2f}s ({fit_time / num_boost_round * 1000:.2f}ms/round), "
+          f"test logloss {logloss(y_test, pred):.4f}, test accuracy {accuracy:.4f}")